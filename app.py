@@ -1,19 +1,255 @@
+import functools
+import gzip
+import json
+import os
 import threading
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 
 import pytz
-from flask import Flask, jsonify, render_template, request
+from flask import Flask, Response, g, jsonify, make_response, render_template, request
 
-from database import init_db, get_daily_view, get_all_dates, get_full_history, get_terrain_history, get_resort_snow_history, get_avalanche_forecast, save_snapshot, update_daily_summary
-from scraper import scrape_all
-from avalanche import fetch_avalanche_forecast
+from database import (
+    init_db, get_data_version, get_all_dates, get_terrain_history, get_resort_snow_history,
+    get_http_validator_stats, get_scrape_runs, get_scrape_jobs, request_scrape_job_cancel,
+)
+from jobs import run_scrape, new_job, get_job
+import coordinator
+import fetch
+import health
+import history
+import leader
+import metrics
+import response_cache
+import scrape_worker
+import sealed_days
 
 app = Flask(__name__)
 MTN_TZ = pytz.timezone("America/Denver")
 
 init_db()
+history.warm()
+metrics.share()
 
-scrape_lock = threading.Lock()
+
+@metrics.collector
+def _process_gauges():
+    """This process's gauges, refreshed before /api/metrics renders and each shared-metrics flush."""
+    worker = scrape_worker.stats()
+    if worker is not None:
+        metrics.set_gauges("scrape_worker_rss_megabytes", "Resident memory of the scrape worker and its browsers.",
+                           [({}, worker["rss_mb"])] if worker["rss_mb"] is not None else [])
+        metrics.set_gauges("scrape_worker_restarts_total", "Times the scrape worker was killed and replaced.",
+                           [({}, worker["restarts"])], "counter")
+    browsers = scrape_worker.browser_stats()
+    if browsers:  # only the process that owns the browsers has any
+        metrics.set_gauges("browser_rss_megabytes", "Resident memory of a warm Chromium worker's process tree.",
+                           [({"worker": b["worker"]}, b["rss_mb"]) for b in browsers if b["rss_mb"] is not None])
+        metrics.set_gauges("browser_open_pages", "Pages open in a warm Chromium worker.",
+                           [({"worker": b["worker"]}, b["pages"]) for b in browsers])
+        metrics.set_gauges("browser_launches_total", "Chromium launches per warm worker.",
+                           [({"worker": b["worker"]}, b["launches"]) for b in browsers], "counter")
+
+    pid = os.getpid()
+    cache_stats = response_cache.cache.stats()
+    metrics.set_gauges("response_cache_bytes", "Bytes held by each worker's response cache.",
+                       [({"pid": pid}, cache_stats["bytes"])])
+    metrics.set_gauges("response_cache_lookups_total", "Response cache lookups by worker and result.",
+                       [({"pid": pid, "result": "hit"}, cache_stats["hits"]),
+                        ({"pid": pid, "result": "miss"}, cache_stats["misses"])],
+                       "counter")
+
+
+@app.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _record_latency(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        metrics.observe(
+            "http_request_duration_seconds", time.perf_counter() - started,
+            endpoint=request.endpoint or "unknown", method=request.method, status=response.status_code,
+        )
+    return response
+
+
+# Same output as jsonify (sorted keys, compact), but encoded incrementally
+_stream_encoder = json.JSONEncoder(sort_keys=True, separators=(",", ":"))
+STREAM_CHUNK_BYTES = 16 * 1024
+
+
+def _stream_json(obj):
+    """Stream obj as JSON in ~16 KB chunks instead of building the whole body in memory."""
+    def generate():
+        buf = []
+        size = 0
+        for piece in _stream_encoder.iterencode(obj):
+            buf.append(piece)
+            size += len(piece)
+            if size >= STREAM_CHUNK_BYTES:
+                yield "".join(buf)
+                buf = []
+                size = 0
+        if buf:
+            yield "".join(buf)
+
+    return Response(generate(), mimetype="application/json")
+
+
+WINDOW_ARGS_ERROR = "from/to/cursor must be YYYY-MM-DD and limit a positive integer"
+
+
+def _window_args():
+    """Parse from/to/limit/cursor query args into (start, end, limit).
+
+    Pages run newest-first: a response's next_cursor is the oldest date it
+    holds, and passing it back as cursor returns the dates just before it.
+    Raises ValueError on malformed values.
+    """
+    start = request.args.get("from") or None
+    end = request.args.get("to") or None
+    cursor = request.args.get("cursor") or None
+    limit = request.args.get("limit") or None
+    for d in (start, end, cursor):
+        if d:
+            datetime.strptime(d, "%Y-%m-%d")
+    if limit is not None:
+        limit = int(limit)
+        if limit < 1:
+            raise ValueError("limit must be positive")
+    if cursor:
+        before = (datetime.strptime(cursor, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
+        end = min(end, before) if end else before
+    return start, end, limit
+
+
+def _page_days(days, limit):
+    """Trim a {date: value} map fetched with limit + 1; returns (days, next_cursor)."""
+    if limit is None or len(days) <= limit:
+        return days, None
+    dates = list(days)[1:]
+    return {d: days[d] for d in dates}, dates[0]
+
+
+# Changes whenever the deployed code does, so a new response format is never
+# answered with a 304 for a body cached from the previous release.
+_CODE_STAMP = format(int(max(
+    os.path.getmtime(os.path.join(os.path.dirname(os.path.abspath(__file__)), name))
+    for name in ("app.py", "database.py", "history.py", "sealed_days.py")
+)), "x")
+
+
+def _request_date():
+    """The ?date= argument, defaulting to today in Mountain time."""
+    return request.args.get("date") or datetime.now(MTN_TZ).strftime("%Y-%m-%d")
+
+
+def versioned(scope=None):
+    """Tag a read endpoint with a strong ETag derived from the data version.
+
+    A matching If-None-Match is answered with 304 before the view runs, so
+    clients polling unchanged data never reach the queries. scope adds
+    request-derived parts (e.g. the resolved date) that change the body
+    without a data write.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = f"{_CODE_STAMP}-{get_data_version()}"
+            if scope:
+                etag += f"-{scope()}"
+            if etag in request.if_none_match:
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+        return wrapper
+    return decorator
+
+
+def sealed(kind):
+    """Serve a finished day's sealed payload with far-future cache headers.
+
+    Today, and days that have not been sealed yet, fall through to the live view.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            seal = sealed_days.get_sealed(_request_date(), kind)
+            if seal is None:
+                return view(*args, **kwargs)
+            etag, body = seal
+            if etag in request.if_none_match:
+                response = Response(status=304)
+            elif "gzip" in request.accept_encodings:
+                response = Response(body, mimetype="application/json")
+                response.headers["Content-Encoding"] = "gzip"
+            else:
+                response = Response(gzip.decompress(body), mimetype="application/json")
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+            response.headers["Vary"] = "Accept-Encoding"
+            return response
+        return wrapper
+    return decorator
+
+
+def cached(kind, date=None, resort=None):
+    """Serve a read endpoint's JSON body from the in-process response cache.
+
+    date/resort return the scope the body depends on; the ingest path uses
+    them to invalidate exactly the affected entries.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = response_cache.cache
+            date_str = date() if date else None
+            resort_name = resort() if resort else None
+            key = (kind, date_str, tuple(sorted(request.args.items(multi=True))))
+            hit = cache.get(key, get_data_version())
+            if hit is not None:
+                return Response(hit[0], mimetype=hit[1])
+            generation = cache.generation
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+            def fill(body):
+                cache.put(key, body, response.mimetype, kind, date_str, resort_name, generation)
+
+            if response.is_streamed:
+                response.response = _tee(response.response, fill, cache.max_entry_bytes)
+            else:
+                fill(response.get_data())
+            return response
+        return wrapper
+    return decorator
+
+
+def _tee(chunks, fill, max_bytes):
+    """Pass a streamed body through, handing the full bytes to fill() if small enough."""
+    kept = []
+    size = 0
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        if kept is not None:
+            size += len(chunk)
+            if size <= max_bytes:
+                kept.append(chunk)
+            else:
+                kept = None
+        yield chunk
+    if kept is not None:
+        fill(b"".join(kept))
 
 
 @app.route("/")
@@ -22,100 +258,190 @@ def index():
 
 
 @app.route("/api/status")
+@sealed("status")
+@versioned(scope=_request_date)
+@cached("status", date=_request_date)
 def api_status():
-    date_str = request.args.get("date")
-    if not date_str:
-        date_str = datetime.now(MTN_TZ).strftime("%Y-%m-%d")
-
-    view = get_daily_view(date_str)
-
-    response = {}
-    for resort, terrain_list in view.items():
-        snow = terrain_list[0]["snowfall_24hr"] if terrain_list else 0.0
-        response[resort] = {
-            "snow_24hr": snow,
-            "terrain": [
-                {
-                    "name": t["terrain_name"],
-                    "ever_opened": bool(t["ever_opened"]),
-                    "closed_streak": t["closed_streak"],
-                }
-                for t in terrain_list
-            ],
-        }
-
-    return jsonify(response)
+    return jsonify(sealed_days.status_payload(_request_date()))
 
 
 @app.route("/api/dates")
+@versioned()
+@cached("dates")
 def api_dates():
     return jsonify(get_all_dates())
 
 
 @app.route("/api/history")
+@versioned()
+@cached("history")
 def api_history():
-    data = get_full_history()
-    return jsonify(data)
+    try:
+        start, end, limit = _window_args()
+    except ValueError:
+        return jsonify({"error": WINDOW_ARGS_ERROR}), 400
+    data = history.get_history(start, end, limit + 1 if limit else None)
+    if limit:
+        data["next_cursor"] = None
+        if len(data["dates"]) > limit:
+            oldest = data["dates"].pop(0)
+            for section in ("terrain", "snow"):
+                for key, days in list(data[section].items()):
+                    days.pop(oldest, None)
+                    if not days:
+                        del data[section][key]
+            data["next_cursor"] = data["dates"][0]
+    return _stream_json(data)
 
 
 @app.route("/api/terrain-calendar")
+@versioned()
+@cached("terrain-calendar", resort=lambda: request.args.get("resort"))
 def api_terrain_calendar():
     resort = request.args.get("resort")
     terrain = request.args.get("terrain")
     if not resort or not terrain:
         return jsonify({"error": "resort and terrain required"}), 400
-    days = get_terrain_history(resort, terrain)
-    return jsonify({"resort": resort, "terrain": terrain, "days": days})
+    try:
+        start, end, limit = _window_args()
+    except ValueError:
+        return jsonify({"error": WINDOW_ARGS_ERROR}), 400
+    days = get_terrain_history(resort, terrain, start, end, limit + 1 if limit else None)
+    days, next_cursor = _page_days(days, limit)
+    data = {"resort": resort, "terrain": terrain, "days": days}
+    if limit:
+        data["next_cursor"] = next_cursor
+    return _stream_json(data)
 
 
 @app.route("/api/snow-calendar")
+@versioned()
+@cached("snow-calendar", resort=lambda: request.args.get("resort"))
 def api_snow_calendar():
     resort = request.args.get("resort")
     if not resort:
         return jsonify({"error": "resort required"}), 400
-    days = get_resort_snow_history(resort)
-    return jsonify({"resort": resort, "days": days})
+    try:
+        start, end, limit = _window_args()
+    except ValueError:
+        return jsonify({"error": WINDOW_ARGS_ERROR}), 400
+    days = get_resort_snow_history(resort, start, end, limit + 1 if limit else None)
+    days, next_cursor = _page_days(days, limit)
+    data = {"resort": resort, "days": days}
+    if limit:
+        data["next_cursor"] = next_cursor
+    return _stream_json(data)
 
 
 @app.route("/api/avalanche")
+@sealed("avalanche")
+@versioned(scope=_request_date)
+@cached("avalanche", date=_request_date)
 def api_avalanche():
-    date_str = request.args.get("date")
-    if not date_str:
-        date_str = datetime.now(MTN_TZ).strftime("%Y-%m-%d")
-    forecast = get_avalanche_forecast("salt-lake", date_str)
-    return jsonify(forecast or {})
+    return jsonify(sealed_days.avalanche_payload(_request_date()))
 
 
 @app.route("/api/scrape", methods=["POST"])
 def api_scrape():
-    if not scrape_lock.acquire(blocking=False):
-        return jsonify({"status": "already_running"}), 409
-
-    def _run():
-        try:
-            now = datetime.now(MTN_TZ)
-            date_str = now.strftime("%Y-%m-%d")
-            scraped_at = now.isoformat()
-            results = scrape_all()
-            for resort, data in results.items():
-                snow = data.get("snow_24hr", 0.0)
-                for t in data.get("terrain", []):
-                    save_snapshot(resort, t["name"], t["status"], scraped_at)
-                    update_daily_summary(resort, t["name"], date_str, t["status"], snow)
-            try:
-                fetch_avalanche_forecast()
-            except Exception as e:
-                print(f"[scrape] Avalanche fetch error: {e}", flush=True)
-        finally:
-            scrape_lock.release()
-
-    threading.Thread(target=_run, daemon=True).start()
-    return jsonify({"status": "started"}), 202
+    """Start a scrape job, or point at the one in flight or one that just finished (see coordinator.py).
+
+    Outside the scheduler leader the job is queued for the leader to run.
+    """
+    running = coordinator.current()
+    if running is not None:
+        return jsonify({"status": "joined", "job": running["job_id"], "trigger": running["trigger"],
+                        "started_at": running["started_at"]}), 202
+    recent = coordinator.last_run(coordinator.FRESH_S)
+    if recent is not None:
+        return jsonify({"status": "fresh", "job": recent["job_id"], "started_at": recent["started_at"],
+                        "finished_at": recent["finished_at"]})
+
+    if not leader.is_leader() and leader.held():
+        # The leader owns the browsers; its job queue picks this up within a second
+        return jsonify({"status": "queued", "job": new_job("manual", for_leader=True)}), 202
+
+    # Races with another trigger still coalesce inside run_scrape (the job then ends as "joined")
+    job_id = new_job("manual")
+    threading.Thread(target=run_scrape, kwargs={"with_avalanche": True, "trigger": "manual", "job_id": job_id},
+                     daemon=True).start()
+    return jsonify({"status": "started", "job": job_id}), 202
+
+
+@app.route("/api/jobs")
+def api_jobs():
+    limit = min(request.args.get("limit", 20, type=int), 100)
+    return jsonify(get_scrape_jobs(limit))
+
+
+@app.route("/api/jobs/<job_id>")
+def api_job(job_id):
+    """A scrape job's status, per-resort progress and results, and a rough ETA while it runs."""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+    return jsonify(job)
+
+
+@app.route("/api/jobs/<job_id>/cancel", methods=["POST"])
+def api_job_cancel(job_id):
+    """Cancel a queued or running job; resorts it already ingested are kept."""
+    if not request_scrape_job_cancel(job_id):
+        if get_job(job_id) is None:
+            return jsonify({"error": "unknown job"}), 404
+        return jsonify({"error": "job already finished"}), 409
+    return jsonify({"status": "cancelling", "job": job_id}), 202
 
 
 @app.route("/api/scrape-status")
 def api_scrape_status():
-    return jsonify({"running": scrape_lock.locked()})
+    return jsonify({
+        "running": coordinator.current(),
+        "leader": leader.status(),
+        "worker": scrape_worker.stats(),
+        "browsers": scrape_worker.browser_stats(),
+        "health": health.snapshot(),
+        "http": {"process": fetch.stats, "urls": get_http_validator_stats()},
+    })
+
+
+@app.route("/api/cache-stats")
+def api_cache_stats():
+    return jsonify(response_cache.cache.stats())
+
+
+@app.route("/api/metrics")
+def api_metrics():
+    """Prometheus text format: every worker's histograms and counters plus gauges read at scrape time.
+
+    Whichever worker answers, histograms and counters are summed over all of
+    them (metrics.share()); the scrape worker and browser gauges come from
+    the scheduler leader, and each worker's response cache is labelled by pid.
+    """
+    runs = get_scrape_runs(limit=1)
+    if runs:
+        last = runs[0]
+        started = datetime.fromisoformat(last["started_at"]).timestamp()
+        metrics.set_gauges("scrape_last_run_timestamp_seconds", "Start of the last recorded scrape run.",
+                           [({}, started)])
+        metrics.set_gauges("scrape_last_run_seconds", "Duration of the last recorded scrape run.",
+                           [({}, last["duration_s"])])
+        metrics.set_gauges("scrape_last_run_failed_resorts", "Resorts without terrain in the last run.",
+                           [({}, last["failed"])])
+        metrics.set_gauges("scrape_last_run_changed_cells", "Daily summary cells the last run changed.",
+                           [({}, last["cells_changed"])])
+        metrics.set_gauges(
+            "scrape_last_run_phase_seconds", "Per resort and phase time in the last run.",
+            [(dict(zip(("resort", "phase"), key.split(".", 1))), seconds)
+             for key, seconds in last["timings"].items()],
+        )
+
+    resorts = health.snapshot()
+    metrics.set_gauges("scrape_resort_consecutive_failures", "Consecutive failed scrapes per resort.",
+                       [({"resort": r}, row["consecutive_failures"]) for r, row in resorts.items()])
+    metrics.set_gauges("scrape_resort_breaker_open", "1 while a resort's circuit breaker skips it.",
+                       [({"resort": r}, int(row["state"] == "open")) for r, row in resorts.items()])
+
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 
 if __name__ == "__main__":
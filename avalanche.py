@@ -2,12 +2,13 @@
 
 import json
 import re
-import requests
 from datetime import datetime
 import pytz
 from bs4 import BeautifulSoup as BS
 
-from database import save_avalanche_forecast
+from database import save_avalanche_forecast, get_data_version
+from response_cache import cache
+from fetch import conditional_get
 
 MTN_TZ = pytz.timezone("America/Denver")
 
@@ -144,9 +145,13 @@ def fetch_avalanche_forecast():
     fetched_at = now.isoformat()
 
     try:
-        resp = requests.get(UAC_URL, headers=HEADERS, timeout=15)
-        resp.raise_for_status()
-        data = resp.json()
+        # Keyed by date: the same body can mean "not issued yet" one day and
+        # a forecast to store under the next
+        fetched = conditional_get(UAC_URL, key=f"{UAC_URL}#{date_str}", headers=HEADERS, timeout=15)
+        if fetched.unchanged:
+            print(f"[avalanche] Forecast unchanged since last fetch ({fetched.parsed}), skipping", flush=True)
+            return False
+        data = fetched.response.json()
 
         # UAC API structure: {"advisories": [{"advisory": {...}}]}
         # Extract the advisory dict from the nested structure
@@ -164,6 +169,7 @@ def fetch_avalanche_forecast():
         issued_date = _get_issued_date(advisory, data)
         if issued_date and issued_date != date_str:
             print(f"[avalanche] Forecast is from {issued_date}, not today ({date_str}). Skipping — UAC hasn't posted yet.", flush=True)
+            fetched.remember(f"issued {issued_date}")
             return False
 
         # Extract bottom line (HTML content)
@@ -201,6 +207,8 @@ def fetch_avalanche_forecast():
             "salt-lake", date_str, overall_danger, bottom_line,
             json.dumps(stored_data), fetched_at
         )
+        cache.invalidate_avalanche(date_str, get_data_version())
+        fetched.remember(f"saved, issued {issued_date}")
 
         print(f"[avalanche] Saved forecast issued {issued_date}. Danger: {overall_danger}, Problems: {len(problems)}, Bottom line: {len(bottom_line)} chars")
         return True
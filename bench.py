@@ -0,0 +1,111 @@
+"""Offline scraper benchmark over recorded fixtures.
+
+    python scraper.py --record [version]     # once, with network
+    python bench.py [version] [--runs N]     # any time, no network
+
+Replays a recording (default: the newest) and reports parse time per resort
+for the HTML parsers, end-to-end scrape_all() wall time (sequential and
+concurrent) and peak resident memory of this process and its browsers. Any
+difference from the results captured while recording is listed and makes the
+exit status 1, so the same run catches parser regressions.
+"""
+
+import os
+import resource
+import statistics
+import sys
+import threading
+import time
+
+import fixtures
+import fetch
+import scraper
+from browser_service import tree_rss_mb
+
+
+def log(msg):
+    print(msg, flush=True)
+
+
+# Resorts whose parsing runs in Python, with how to feed them the recording
+PARSERS = {
+    "snowbasin": lambda: scraper.parse_snowbasin(fetch.session.get(scraper.SNOWBASIN_URL, timeout=5).text),
+    "solitude": lambda: scraper.parse_solitude(*fixtures.page_fixture("solitude")),
+}
+
+
+class PeakRss:
+    """Samples this process tree's RSS in the background; .peak_mb is the highest seen."""
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, tree_rss_mb(os.getpid()) or 0.0)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def bench_parsers(runs):
+    for resort, parse in PARSERS.items():
+        try:
+            parse()
+        except Exception as e:
+            log(f"[bench] {resort:15} parse: no fixture ({e})")
+            continue
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            parse()
+            timings.append((time.perf_counter() - started) * 1000)
+        log(f"[bench] {resort:15} parse: median {statistics.median(timings):.1f} ms, "
+            f"min {min(timings):.1f} ms over {runs} runs ({scraper.HTML_PARSER})")
+
+
+def bench_end_to_end(expected):
+    problems = []
+    for label, concurrency in (("sequential", 1), ("concurrent", scraper.CONCURRENCY)):
+        with PeakRss() as rss:
+            started = time.monotonic()
+            results = scraper.scrape_all(concurrency=concurrency)
+            elapsed = time.monotonic() - started
+        log(f"[bench] scrape_all {label:10} {elapsed:.2f} s, peak tree RSS {rss.peak_mb:.0f} MB")
+        problems += [f"{label}: {p}" for p in fixtures.diff_results(expected, results)]
+    return problems
+
+
+def main(argv):
+    runs = 20
+    version = None
+    args = iter(argv)
+    for arg in args:
+        if arg == "--runs":
+            runs = int(next(args))
+        elif not arg.startswith("--"):
+            version = arg
+
+    version = fixtures.replay(version)
+    bench_parsers(runs)
+    problems = bench_end_to_end(fixtures.load_results())
+    log(f"[bench] peak RSS: self {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB, "
+        f"largest child {resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024:.0f} MB")
+
+    for problem in problems:
+        log(f"[bench] REGRESSION {problem}")
+    log(f"[bench] {version}: {len(problems)} difference(s) from the recording")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,229 @@
+"""Long-lived Chromium workers that stay warm between scrapes.
+
+The sync Playwright API is bound to the thread that started it, so each
+worker is a thread owning one driver + browser for its whole life and runs
+the jobs scrape_all() hands it. A worker relaunches its browser after a crash
+and recycles it once its process tree goes over MAX_RSS_MB or it has been up
+longer than MAX_AGE_S. Started by the process that runs the scheduler
+(start.py / scheduler.py); without it scrape_all() falls back to a cold launch.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+MAX_RSS_MB = int(os.environ.get("BROWSER_MAX_RSS_MB", "700"))
+MAX_AGE_S = int(os.environ.get("BROWSER_MAX_AGE_MIN", "360")) * 60
+
+_jobs = queue.Queue()
+_workers = []
+# Serializes driver start-up so each worker can tell which child process is its own
+_launch_lock = threading.Lock()
+
+
+def log(msg):
+    print(msg, flush=True)
+
+
+def _children():
+    """Map ppid -> [pid] from /proc (empty where /proc is unavailable)."""
+    tree = {}
+    try:
+        pids = [p for p in os.listdir("/proc") if p.isdigit()]
+    except FileNotFoundError:
+        return tree
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name is parenthesised and may contain spaces
+        ppid = int(stat[stat.rindex(")") + 2:].split()[1])
+        tree.setdefault(ppid, []).append(int(pid))
+    return tree
+
+
+def tree_rss_mb(root):
+    """Resident memory of root and all its descendants, in MB (None if unknown)."""
+    tree = _children()
+    if not tree:
+        return None
+    total_kb = 0
+    stack = [root]
+    while stack:
+        pid = stack.pop()
+        stack.extend(tree.get(pid, []))
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return round(total_kb / 1024, 1)
+
+
+class BrowserWorker(threading.Thread):
+    def __init__(self, index, launch_args):
+        super().__init__(name=f"chromium-{index}", daemon=True)
+        self.index = index
+        self.launch_args = launch_args
+        self._playwright = None
+        self._browser = None
+        self._driver_pid = None
+        self.launched_at = None
+        self.launches = 0
+        self.crashes = 0
+        self.recycles = 0
+        self.jobs_run = 0
+        self.rss_mb = None
+        self.pages = 0
+
+    def _launch(self):
+        from playwright.sync_api import sync_playwright
+
+        with _launch_lock:
+            before = set(_children().get(os.getpid(), []))
+            self._playwright = sync_playwright().start()
+            after = set(_children().get(os.getpid(), []))
+        new = after - before
+        self._driver_pid = new.pop() if len(new) == 1 else None
+        self._browser = self._playwright.chromium.launch(headless=True, args=self.launch_args)
+        self.launched_at = time.monotonic()
+        self.launches += 1
+        log(f"[browser] Worker {self.index} launched Chromium (launch #{self.launches})")
+
+    def _close(self):
+        for close in (self._browser and self._browser.close, self._playwright and self._playwright.stop):
+            if close:
+                try:
+                    close()
+                except Exception:
+                    pass
+        self._browser = None
+        self._playwright = None
+        self._driver_pid = None
+
+    def _ensure_browser(self):
+        if self._browser is not None and self._browser.is_connected():
+            return
+        if self._browser is not None:
+            self.crashes += 1
+            log(f"[browser] Worker {self.index} lost its browser; restarting")
+        self._close()
+        self._launch()
+
+    def _measure(self):
+        self.rss_mb = tree_rss_mb(self._driver_pid) if self._driver_pid else None
+        try:
+            self.pages = sum(len(c.pages) for c in self._browser.contexts)
+        except Exception:
+            self.pages = 0
+
+    def _maybe_recycle(self):
+        if self._browser is None:
+            return
+        self._measure()
+        age = time.monotonic() - self.launched_at
+        if self.rss_mb is not None and self.rss_mb > MAX_RSS_MB:
+            reason = f"RSS {self.rss_mb} MB > {MAX_RSS_MB} MB"
+        elif age > MAX_AGE_S:
+            reason = f"age {age / 60:.0f} min"
+        else:
+            return
+        log(f"[browser] Worker {self.index} recycling Chromium ({reason})")
+        self.recycles += 1
+        self._close()
+        # Relaunch now so the next scrape finds a warm browser
+        self._launch()
+
+    def _run_job(self, fn):
+        self._ensure_browser()
+        try:
+            result = fn(self._browser)
+        except Exception:
+            if self._browser.is_connected():
+                raise
+        else:
+            # Scrapers swallow their own errors, so check the browser survived
+            if self._browser.is_connected():
+                return result
+        # The browser died mid-job: restart and retry once on a fresh one
+        self._ensure_browser()
+        return fn(self._browser)
+
+    def run(self):
+        try:
+            self._launch()
+        except Exception as e:
+            log(f"[browser] Worker {self.index} launch failed: {e}")
+            self._close()
+        while True:
+            job = _jobs.get()
+            if job is None:
+                break
+            fn, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self._run_job(fn))
+            except Exception as e:
+                future.set_exception(e)
+            try:
+                self._maybe_recycle()
+            except Exception as e:
+                log(f"[browser] Worker {self.index} recycle failed: {e}")
+                self._close()
+            self.jobs_run += 1
+        self._close()
+
+    def stats(self):
+        return {
+            "worker": self.index,
+            "up": self._browser is not None,
+            "age_s": round(time.monotonic() - self.launched_at) if self._browser is not None else None,
+            "rss_mb": self.rss_mb,
+            "pages": self.pages,
+            "jobs": self.jobs_run,
+            "launches": self.launches,
+            "recycles": self.recycles,
+            "crashes": self.crashes,
+        }
+
+
+def start(workers, launch_args):
+    """Start `workers` browser threads, each launching its Chromium right away."""
+    if _workers:
+        return
+    for i in range(workers):
+        worker = BrowserWorker(i, launch_args)
+        worker.start()
+        _workers.append(worker)
+    log(f"[browser] Started {workers} warm Chromium worker(s)")
+
+
+def stop(timeout=30):
+    for _ in _workers:
+        _jobs.put(None)
+    for worker in _workers:
+        worker.join(timeout)
+    _workers.clear()
+
+
+def running():
+    return bool(_workers)
+
+
+def submit(fn):
+    """Run fn(browser) on a warm worker; returns a Future."""
+    future = Future()
+    _jobs.put((fn, future))
+    return future
+
+
+def stats():
+    return [worker.stats() for worker in _workers]
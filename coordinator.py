@@ -0,0 +1,135 @@
+"""One scrape at a time across every process, with coalescing.
+
+Every trigger (the scheduler, /api/scrape, scheduler.py) calls run(). The
+caller that takes the scrape_lease row in SQLite runs the scrape and keeps
+the lease alive with a heartbeat; a lease whose holder stops renewing it
+(LEASE_TTL_S) or whose process is gone can be taken over. A caller that
+finds a scrape in flight attaches to it: it waits for that run and gets
+its results instead of starting another Chromium. A caller arriving within
+FRESH_S of a finished run gets that run's results without scraping.
+"""
+
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pytz
+
+from database import (
+    acquire_scrape_lease, renew_scrape_lease, release_scrape_lease, get_scrape_lease, get_scrape_runs,
+)
+
+MTN_TZ = pytz.timezone("America/Denver")
+
+LEASE_TTL_S = int(os.environ.get("SCRAPE_LEASE_TTL_S", "60"))
+FRESH_S = int(os.environ.get("SCRAPE_FRESH_S", "120"))
+POLL_S = 1.0
+
+
+def log(msg):
+    print(msg, flush=True)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def current():
+    """The in-flight scrape's lease row, or None when no live holder has it."""
+    lease = get_scrape_lease()
+    if lease is None or lease["expires_at"] < time.time() or not _pid_alive(lease["pid"]):
+        return None
+    return lease
+
+
+def last_run(max_age_s):
+    """The newest finished run if it finished within max_age_s, else None."""
+    runs = get_scrape_runs(limit=1)
+    if not runs or not runs[0]["finished_at"]:
+        return None
+    finished = datetime.fromisoformat(runs[0]["finished_at"])
+    if datetime.now(MTN_TZ) - finished > timedelta(seconds=max_age_s):
+        return None
+    return runs[0]
+
+
+def _acquire(holder, trigger, started_at, job_id):
+    now = time.time()
+    lease = get_scrape_lease()
+    stale = lease["holder"] if lease is not None and not _pid_alive(lease["pid"]) else None
+    if stale is not None:
+        log(f"[coordinator] Taking over the lease from dead pid {lease['pid']}")
+    return acquire_scrape_lease(holder, os.getpid(), trigger, started_at, now + LEASE_TTL_S, now, stale, job_id)
+
+
+def _heartbeat(holder, done):
+    while not done.wait(LEASE_TTL_S / 4):
+        if not renew_scrape_lease(holder, time.time() + LEASE_TTL_S):
+            log("[coordinator] Lost the scrape lease while running")
+            return
+
+
+def _wait_for(lease, cancelled=None):
+    """Wait for the run holding `lease` to end (or cancelled() to be true); returns its recorded run, or None."""
+    while True:
+        running = current()
+        if running is None or running["holder"] != lease["holder"]:
+            break
+        if cancelled is not None and cancelled():
+            return None
+        time.sleep(POLL_S)
+    runs = get_scrape_runs(limit=1, since=lease["started_at"])
+    return runs[0] if runs else None
+
+
+def run(scrape, trigger, fresh_s=FRESH_S, job_id=None, cancelled=None):
+    """Run scrape(started_at) under the lease, or attach to / reuse another run.
+
+    scrape records its run (save_scrape_run, with results) before returning.
+    Returns (outcome, run, job_id): outcome is "ran", "joined", "fresh" or
+    "cancelled" (cancelled() was true before the scrape started, or while
+    waiting on another run); run is the recorded scrape_runs row, or None if
+    the scrape failed without one; job_id is the job of the run that served
+    the call.
+    """
+    if cancelled is not None and cancelled():
+        return "cancelled", None, None
+    if fresh_s:
+        recent = last_run(fresh_s)
+        if recent is not None:
+            log(f"[coordinator] {trigger}: reusing the run from {recent['started_at']}")
+            return "fresh", recent, recent["job_id"]
+
+    holder = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    while True:
+        started_at = datetime.now(MTN_TZ).isoformat()
+        if _acquire(holder, trigger, started_at, job_id):
+            break
+        lease = current()
+        if lease is not None:
+            log(f"[coordinator] {trigger}: attaching to the {lease['trigger']} run "
+                f"started {lease['started_at']} (pid {lease['pid']})")
+            joined = _wait_for(lease, cancelled)
+            if cancelled is not None and cancelled():
+                log(f"[coordinator] {trigger}: cancelled while waiting")
+                return "cancelled", None, None
+            return "joined", joined, lease["job_id"]
+        # The holder finished (or died) between the two reads; try again
+
+    done = threading.Event()
+    threading.Thread(target=_heartbeat, args=(holder, done), name="scrape-lease", daemon=True).start()
+    try:
+        scrape(started_at)
+    finally:
+        done.set()
+        release_scrape_lease(holder)
+    runs = get_scrape_runs(limit=1, since=started_at)
+    return "ran", runs[0] if runs else None, job_id
@@ -1,6 +1,10 @@
-import sqlite3
+import json
 import os
-from datetime import datetime, timedelta
+import queue
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
 
 # Use /data on Fly.io (persistent volume), or ./data locally
 if os.path.isdir("/data") and os.environ.get("FLY_APP_NAME"):
@@ -9,28 +13,112 @@ else:
     DB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
 DB_PATH = os.path.join(DB_DIR, "terrain.db")
 
+# Idle connections kept open per process (Flask threads + scheduler jobs)
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "4"))
+
+# WAL lets API reads proceed while the scheduler is writing. NORMAL sync is
+# durable across app crashes under WAL; only a power loss can drop the last
+# commit, which the next scrape rewrites anyway.
+PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -8000",  # KiB, per connection
+    "PRAGMA mmap_size = 67108864",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+]
 
-def _connect():
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+_pool_pid = os.getpid()
+_pool_lock = threading.Lock()
+
+
+def _open():
     os.makedirs(DB_DIR, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, timeout=5, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
     return conn
 
 
-def init_db():
-    conn = _connect()
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS terrain_snapshots (
+def close_pool():
+    """Close every idle pooled connection (e.g. on shutdown or after moving DB_PATH)."""
+    while True:
+        try:
+            _pool.get_nowait().close()
+        except queue.Empty:
+            break
+
+
+def _reset_after_fork():
+    # Connections must never cross a fork. Drop the inherited ones without
+    # closing them (closing could checkpoint the parent's WAL) and start over.
+    global _pool, _pool_pid
+    with _pool_lock:
+        if os.getpid() != _pool_pid:
+            _pool = queue.LifoQueue(maxsize=POOL_SIZE)
+            _pool_pid = os.getpid()
+
+
+@contextmanager
+def _connection():
+    """Borrow a pooled connection; commits on success, rolls back on error."""
+    if os.getpid() != _pool_pid:
+        _reset_after_fork()
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = _open()
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        try:
+            _pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+
+def _compact_snapshots(conn):
+    """One-time conversion of raw terrain_snapshots rows into status intervals."""
+    rows = conn.execute(
+        "SELECT resort, terrain_name, status, scraped_at FROM terrain_snapshots "
+        "ORDER BY resort, terrain_name, scraped_at"
+    )
+    intervals = []
+    current = None
+    for resort, terrain_name, status, scraped_at in rows:
+        if current and current[:3] == [resort, terrain_name, status]:
+            current[4] = scraped_at
+            continue
+        current = [resort, terrain_name, status, scraped_at, scraped_at]
+        intervals.append(current)
+    conn.executemany(
+        "INSERT INTO terrain_status_intervals (resort, terrain_name, status, valid_from, valid_to) VALUES (?, ?, ?, ?, ?)",
+        intervals,
+    )
+    print(f"[db] Compacted terrain snapshots into {len(intervals)} status intervals", flush=True)
+
+
+# Schema migrations, applied in order. PRAGMA user_version stores how many
+# have run, so an existing database (e.g. on the Fly volume) is upgraded in
+# place on startup. Each entry is a list of SQL statements or callables taking
+# the connection. Only ever append; never edit a migration that has shipped.
+MIGRATIONS = [
+    # 1: original schema (IF NOT EXISTS so pre-migration databases adopt it)
+    [
+        """CREATE TABLE IF NOT EXISTS terrain_snapshots (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             resort TEXT NOT NULL,
             terrain_name TEXT NOT NULL,
             status TEXT NOT NULL,
             scraped_at TEXT NOT NULL
-        )
-    """)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS daily_summary (
+        )""",
+        """CREATE TABLE IF NOT EXISTS daily_summary (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             resort TEXT NOT NULL,
             terrain_name TEXT NOT NULL,
@@ -38,10 +126,8 @@ def init_db():
             ever_opened INTEGER NOT NULL DEFAULT 0,
             snowfall_24hr REAL NOT NULL DEFAULT 0.0,
             UNIQUE(resort, terrain_name, date)
-        )
-    """)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS avalanche_forecasts (
+        )""",
+        """CREATE TABLE IF NOT EXISTS avalanche_forecasts (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             region TEXT NOT NULL,
             date TEXT NOT NULL,
@@ -50,190 +136,666 @@ def init_db():
             forecast_json TEXT,
             fetched_at TEXT NOT NULL,
             UNIQUE(region, date)
-        )
-    """)
-    conn.commit()
-    conn.close()
+        )""",
+    ],
+    # 2: covering indexes for the read paths (see HOT_QUERIES)
+    [
+        """CREATE INDEX IF NOT EXISTS idx_daily_summary_date
+           ON daily_summary(date, resort, terrain_name, ever_opened, snowfall_24hr)""",
+        """CREATE INDEX IF NOT EXISTS idx_daily_summary_resort_date
+           ON daily_summary(resort, date, snowfall_24hr)""",
+        """CREATE INDEX IF NOT EXISTS idx_terrain_snapshots_terrain
+           ON terrain_snapshots(resort, terrain_name, scraped_at)""",
+    ],
+    # 3: store status transitions instead of one row per terrain per scrape
+    [
+        """CREATE TABLE terrain_status_intervals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            resort TEXT NOT NULL,
+            terrain_name TEXT NOT NULL,
+            status TEXT NOT NULL,
+            valid_from TEXT NOT NULL,
+            valid_to TEXT NOT NULL
+        )""",
+        """CREATE INDEX idx_status_intervals_terrain
+           ON terrain_status_intervals(resort, terrain_name, valid_from)""",
+        _compact_snapshots,
+        "DROP TABLE terrain_snapshots",
+    ],
+    # 4: dictionary-encode resort/terrain names into small integer keys
+    [
+        """CREATE TABLE resorts (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )""",
+        """CREATE TABLE terrain (
+            id INTEGER PRIMARY KEY,
+            resort_id INTEGER NOT NULL REFERENCES resorts(id),
+            name TEXT NOT NULL,
+            UNIQUE(resort_id, name)
+        )""",
+        # Ids follow first appearance so id order matches the old row order
+        """INSERT INTO resorts (name)
+           SELECT resort FROM (
+               SELECT resort, MIN(id) AS first_id FROM daily_summary GROUP BY resort
+               UNION ALL
+               SELECT resort, 1e18 + MIN(id) FROM terrain_status_intervals GROUP BY resort
+           )
+           GROUP BY resort ORDER BY MIN(first_id)""",
+        """INSERT INTO terrain (resort_id, name)
+           SELECT r.id, x.terrain_name FROM (
+               SELECT resort, terrain_name, MIN(id) AS first_id FROM daily_summary GROUP BY resort, terrain_name
+               UNION ALL
+               SELECT resort, terrain_name, 1e18 + MIN(id) FROM terrain_status_intervals GROUP BY resort, terrain_name
+           ) x JOIN resorts r ON r.name = x.resort
+           GROUP BY r.id, x.terrain_name ORDER BY MIN(x.first_id)""",
+        """CREATE TABLE daily_summary_v4 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            resort_id INTEGER NOT NULL REFERENCES resorts(id),
+            terrain_id INTEGER NOT NULL REFERENCES terrain(id),
+            date TEXT NOT NULL,
+            ever_opened INTEGER NOT NULL DEFAULT 0,
+            snowfall_24hr REAL NOT NULL DEFAULT 0.0,
+            UNIQUE(terrain_id, date)
+        )""",
+        """INSERT INTO daily_summary_v4 (id, resort_id, terrain_id, date, ever_opened, snowfall_24hr)
+           SELECT d.id, r.id, t.id, d.date, d.ever_opened, d.snowfall_24hr
+           FROM daily_summary d
+           JOIN resorts r ON r.name = d.resort
+           JOIN terrain t ON t.resort_id = r.id AND t.name = d.terrain_name""",
+        "DROP TABLE daily_summary",
+        "ALTER TABLE daily_summary_v4 RENAME TO daily_summary",
+        """CREATE INDEX idx_daily_summary_date
+           ON daily_summary(date, terrain_id, ever_opened, snowfall_24hr)""",
+        """CREATE INDEX idx_daily_summary_resort_date
+           ON daily_summary(resort_id, date, snowfall_24hr)""",
+        """CREATE TABLE terrain_status_intervals_v4 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            terrain_id INTEGER NOT NULL REFERENCES terrain(id),
+            status TEXT NOT NULL,
+            valid_from TEXT NOT NULL,
+            valid_to TEXT NOT NULL
+        )""",
+        """INSERT INTO terrain_status_intervals_v4 (id, terrain_id, status, valid_from, valid_to)
+           SELECT i.id, t.id, i.status, i.valid_from, i.valid_to
+           FROM terrain_status_intervals i
+           JOIN resorts r ON r.name = i.resort
+           JOIN terrain t ON t.resort_id = r.id AND t.name = i.terrain_name""",
+        "DROP TABLE terrain_status_intervals",
+        "ALTER TABLE terrain_status_intervals_v4 RENAME TO terrain_status_intervals",
+        """CREATE INDEX idx_status_intervals_terrain
+           ON terrain_status_intervals(terrain_id, valid_from)""",
+    ],
+    # 5: monotonically increasing data version for HTTP validators
+    [
+        "CREATE TABLE meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+        "INSERT INTO meta (key, value) VALUES ('data_version', 1)",
+    ],
+    # 6: precomputed, gzipped API payloads for finished days
+    [
+        """CREATE TABLE sealed_days (
+            date TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            format INTEGER NOT NULL,
+            etag TEXT NOT NULL,
+            body BLOB NOT NULL,
+            sealed_at TEXT NOT NULL,
+            PRIMARY KEY (date, kind)
+        )""",
+    ],
+    # 7: HTTP validators and last parse per fetched URL, so unchanged bodies skip parsing
+    [
+        """CREATE TABLE http_validators (
+            key TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            body_hash TEXT,
+            parsed TEXT,
+            fetches INTEGER NOT NULL DEFAULT 0,
+            unchanged INTEGER NOT NULL DEFAULT 0,
+            checked_at TEXT
+        )""",
+    ],
+    # 8: rolling per-run scrape timings (see jobs.run_scrape / metrics.py)
+    [
+        """CREATE TABLE scrape_runs (
+            id INTEGER PRIMARY KEY,
+            started_at TEXT NOT NULL,
+            duration_s REAL NOT NULL,
+            resorts INTEGER NOT NULL,
+            failed INTEGER NOT NULL,
+            cells_changed INTEGER NOT NULL,
+            timings TEXT NOT NULL
+        )""",
+    ],
+    # 9: per-resort scrape health for the circuit breaker (see health.py)
+    [
+        """CREATE TABLE resort_health (
+            resort TEXT PRIMARY KEY,
+            consecutive_failures INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            last_latency_s REAL,
+            last_success_at TEXT,
+            last_failure_at TEXT,
+            open_until TEXT,
+            skipped INTEGER NOT NULL DEFAULT 0
+        )""",
+    ],
+    # 10: cross-process scrape lease, and each run's results for coalesced callers (see coordinator.py)
+    [
+        """CREATE TABLE scrape_lease (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            holder TEXT,
+            pid INTEGER,
+            trigger TEXT,
+            started_at TEXT,
+            expires_at REAL
+        )""",
+        "ALTER TABLE scrape_runs ADD COLUMN finished_at TEXT",
+        "ALTER TABLE scrape_runs ADD COLUMN trigger TEXT",
+        "ALTER TABLE scrape_runs ADD COLUMN results TEXT",
+    ],
+    # 11: scrape jobs with per-resort progress (see jobs.py)
+    [
+        "ALTER TABLE scrape_lease ADD COLUMN job_id TEXT",
+        "ALTER TABLE scrape_runs ADD COLUMN job_id TEXT",
+        """CREATE TABLE scrape_jobs (
+            id TEXT PRIMARY KEY,
+            trigger TEXT NOT NULL,
+            status TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            finished_at TEXT,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            joined_job_id TEXT,
+            cells_changed INTEGER,
+            error TEXT
+        )""",
+        """CREATE TABLE scrape_job_resorts (
+            job_id TEXT NOT NULL,
+            resort TEXT NOT NULL,
+            state TEXT NOT NULL,
+            started_at TEXT,
+            seconds REAL,
+            error TEXT,
+            result TEXT,
+            PRIMARY KEY (job_id, resort)
+        )""",
+    ],
+    # 12: each terrain's open days, so a closed streak starts from the last one
+    [
+        """CREATE INDEX idx_daily_summary_opened
+           ON daily_summary(terrain_id, date) WHERE ever_opened = 1""",
+    ],
+    # 13: jobs queued for the scheduler leader to run (see jobs.serve_queue)
+    [
+        "ALTER TABLE scrape_jobs ADD COLUMN for_leader INTEGER NOT NULL DEFAULT 0",
+    ],
+]
 
+# Rows kept in scrape_runs (~4 months at 36 scrapes a day)
+SCRAPE_RUNS_KEEP = 5000
+# Jobs kept in scrape_jobs, with their per-resort rows (~2 weeks)
+SCRAPE_JOBS_KEEP = 500
 
-def save_snapshot(resort, terrain_name, status, scraped_at):
-    conn = _connect()
-    conn.execute(
-        "INSERT INTO terrain_snapshots (resort, terrain_name, status, scraped_at) VALUES (?, ?, ?, ?)",
-        (resort, terrain_name, status, scraped_at),
-    )
-    conn.commit()
-    conn.close()
+
+def _migrate(conn):
+    conn.isolation_level = None  # explicit transactions so DDL is covered too
+    try:
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Re-read under the write lock: another process may have migrated
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version >= len(MIGRATIONS):
+                    conn.execute("COMMIT")
+                    return
+                for step in MIGRATIONS[version]:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(step)
+                conn.execute(f"PRAGMA user_version = {version + 1}")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            print(f"[db] Migrated schema to version {version + 1}", flush=True)
+    finally:
+        conn.isolation_level = ""
 
 
-def update_daily_summary(resort, terrain_name, date_str, status, snowfall_24hr):
-    conn = _connect()
-    c = conn.cursor()
+def init_db():
+    with _connection() as conn:
+        _migrate(conn)
+        _load_ids(conn)
 
-    new_ever_opened = 1 if status == "open" else 0
 
-    c.execute(
-        "SELECT ever_opened FROM daily_summary WHERE resort = ? AND terrain_name = ? AND date = ?",
-        (resort, terrain_name, date_str),
-    )
-    row = c.fetchone()
+# In-memory dictionary for the resorts/terrain dimension tables, loaded at
+# startup. Other processes may add terrain, so a miss reloads before giving up.
+_resort_ids = {}  # name -> id
+_resort_names = {}  # id -> name
+_terrain_ids = {}  # (resort, terrain_name) -> id
+_terrain_keys = {}  # id -> (resort, terrain_name)
 
-    if row is None:
-        c.execute(
-            "INSERT INTO daily_summary (resort, terrain_name, date, ever_opened, snowfall_24hr) VALUES (?, ?, ?, ?, ?)",
-            (resort, terrain_name, date_str, new_ever_opened, snowfall_24hr),
-        )
-    else:
-        existing = row["ever_opened"]
-        final_opened = 1 if existing == 1 else new_ever_opened
-        c.execute(
-            "UPDATE daily_summary SET ever_opened = ?, snowfall_24hr = ? WHERE resort = ? AND terrain_name = ? AND date = ?",
-            (final_opened, snowfall_24hr, resort, terrain_name, date_str),
+
+def _load_ids(conn):
+    global _resort_ids, _resort_names, _terrain_ids, _terrain_keys
+    resorts = conn.execute("SELECT id, name FROM resorts").fetchall()
+    terrain = conn.execute("SELECT id, resort_id, name FROM terrain").fetchall()
+    resort_names = {row["id"]: row["name"] for row in resorts}
+    terrain_keys = {row["id"]: (resort_names[row["resort_id"]], row["name"]) for row in terrain}
+    # Swap in whole dicts so concurrent readers never see a half-built cache
+    _resort_ids = {name: id_ for id_, name in resort_names.items()}
+    _resort_names = resort_names
+    _terrain_ids = {key: id_ for id_, key in terrain_keys.items()}
+    _terrain_keys = terrain_keys
+
+
+def _resort_id(conn, resort):
+    if resort not in _resort_ids:
+        _load_ids(conn)
+    return _resort_ids.get(resort)
+
+
+def _terrain_id(conn, resort, terrain_name):
+    key = (resort, terrain_name)
+    if key not in _terrain_ids:
+        _load_ids(conn)
+    return _terrain_ids.get(key)
+
+
+def _create_terrain(conn, keys):
+    """{(resort, terrain_name): (resort_id, terrain_id)} for keys, inserting the ones that are new.
+
+    Runs inside the caller's write transaction, so new rows are looked up
+    through conn but kept out of the shared cache: if the transaction rolls
+    back they never existed. The caller reloads the cache once it commits.
+    """
+    if any(key not in _terrain_ids for key in keys):
+        _load_ids(conn)  # another process may have added them; nothing is written yet
+    ids = {}
+    for resort, terrain_name in keys:
+        terrain_id = _terrain_ids.get((resort, terrain_name))
+        if terrain_id is not None:
+            ids[resort, terrain_name] = (_resort_ids[resort], terrain_id)
+            continue
+        conn.execute("INSERT OR IGNORE INTO resorts (name) VALUES (?)", (resort,))
+        conn.execute(
+            "INSERT OR IGNORE INTO terrain (resort_id, name) SELECT id, ? FROM resorts WHERE name = ?",
+            (terrain_name, resort),
         )
+        row = conn.execute(
+            "SELECT t.resort_id, t.id FROM terrain t JOIN resorts r ON r.id = t.resort_id "
+            "WHERE r.name = ? AND t.name = ?",
+            (resort, terrain_name),
+        ).fetchone()
+        ids[resort, terrain_name] = (row["resort_id"], row["id"])
+    return ids
 
-    conn.commit()
-    conn.close()
 
+def _terrain_key(conn, terrain_id):
+    if terrain_id not in _terrain_keys:
+        _load_ids(conn)
+    return _terrain_keys[terrain_id]
 
-def get_closed_streak(resort, terrain_name, date_str):
-    conn = _connect()
-    c = conn.cursor()
 
-    # Check if today is closed
-    c.execute(
-        "SELECT ever_opened FROM daily_summary WHERE resort = ? AND terrain_name = ? AND date = ?",
-        (resort, terrain_name, date_str),
+# Cached data version, keyed by the stat of the database and WAL files. Every
+# commit in WAL mode rewrites the -wal file, so if neither file changed since
+# the version was read it cannot have moved and no query is needed.
+_data_version = (None, None)
+_data_version_lock = threading.Lock()
+
+
+def _file_stamp():
+    stamp = []
+    for path in (DB_PATH, DB_PATH + "-wal"):
+        try:
+            st = os.stat(path)
+            stamp.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+def _bump_data_version(conn):
+    conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'data_version'")
+
+
+def get_data_version():
+    """Current data version; bumped by every scrape ingest and avalanche save."""
+    global _data_version
+    stamp = _file_stamp()
+    cached_stamp, version = _data_version
+    if stamp == cached_stamp:
+        return version
+    with _connection() as conn:
+        version = conn.execute("SELECT value FROM meta WHERE key = 'data_version'").fetchone()[0]
+    with _data_version_lock:
+        _data_version = (stamp, version)
+    return version
+
+
+_INSERT_INTERVAL_SQL = """
+    INSERT INTO terrain_status_intervals (terrain_id, status, valid_from, valid_to)
+    VALUES (?, ?, ?, ?)
+"""
+
+# ever_opened only ever goes 0 -> 1 within a day; snowfall takes the latest reading
+_UPSERT_DAILY_SQL = """
+    INSERT INTO daily_summary (resort_id, terrain_id, date, ever_opened, snowfall_24hr)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(terrain_id, date) DO UPDATE SET
+        ever_opened = max(ever_opened, excluded.ever_opened),
+        snowfall_24hr = excluded.snowfall_24hr
+"""
+
+
+def _record_statuses(conn, observations):
+    """Fold (terrain_id, status, scraped_at) observations into intervals.
+
+    An interval covers one unbroken run of the same status: valid_from is the
+    first scrape that saw it and valid_to the latest. A repeat of the current
+    status only moves valid_to; a change starts a new interval.
+    """
+    extend = []
+    start = []
+    for terrain_id, status, scraped_at in observations:
+        row = conn.execute(_LATEST_INTERVAL_SQL, (terrain_id,)).fetchone()
+        if row is not None and row["status"] == status:
+            extend.append((scraped_at, row["id"]))
+        else:
+            start.append((terrain_id, status, scraped_at, scraped_at))
+    conn.executemany("UPDATE terrain_status_intervals SET valid_to = max(valid_to, ?) WHERE id = ?", extend)
+    conn.executemany(_INSERT_INTERVAL_SQL, start)
+
+
+def ingest_scrape_results(results, scraped_at):
+    """Write a whole scrape_all() result in one transaction.
+
+    scraped_at is the Mountain-time ISO timestamp of the run; its date part
+    is the daily_summary date. Returns the daily_summary cells this scrape
+    added or changed, as (resort, terrain_name, date, ever_opened,
+    snowfall_24hr) tuples.
+    """
+    date_str = scraped_at[:10]
+    keys = [(resort, t["name"]) for resort, data in results.items() for t in data.get("terrain", [])]
+    with _connection() as conn:
+        ids = _create_terrain(conn, keys)
+        names = {terrain_id: key for key, (_, terrain_id) in ids.items()}
+        observations = []
+        summaries = []
+        for resort, data in results.items():
+            snow = data.get("snow_24hr", 0.0)
+            for t in data.get("terrain", []):
+                resort_id, terrain_id = ids[resort, t["name"]]
+                observations.append((terrain_id, t["status"], scraped_at))
+                summaries.append((resort_id, terrain_id, date_str, 1 if t["status"] == "open" else 0, snow))
+
+        before = {
+            row["terrain_id"]: (row["ever_opened"], row["snowfall_24hr"])
+            for row in conn.execute(_DAILY_VIEW_SQL, (date_str,))
+        }
+        _record_statuses(conn, observations)
+        conn.executemany(_UPSERT_DAILY_SQL, summaries)
+
+        # Read back the stored cells (ever_opened is max'd against earlier runs)
+        written = {terrain_id for _, terrain_id, _, _, _ in summaries}
+        cells = []
+        for row in conn.execute(_DAILY_VIEW_SQL, (date_str,)):
+            terrain_id = row["terrain_id"]
+            if terrain_id in written and before.get(terrain_id) != (row["ever_opened"], row["snowfall_24hr"]):
+                resort, terrain_name = names[terrain_id]
+                cells.append((resort, terrain_name, date_str, row["ever_opened"], row["snowfall_24hr"]))
+
+        # Nothing the API serves changed (status intervals aren't exposed), so
+        # ETags, sealed payloads and response caches stay valid
+        if cells:
+            _unseal(conn, date_str, "status")
+            _bump_data_version(conn)
+    if any(terrain_id not in _terrain_keys for terrain_id in names):
+        with _connection() as conn:
+            _load_ids(conn)  # committed now, so the new terrain can be cached
+    return cells
+
+
+_LATEST_INTERVAL_SQL = """
+    SELECT id, status, valid_from, valid_to
+    FROM terrain_status_intervals
+    WHERE terrain_id = ?
+    ORDER BY valid_from DESC
+    LIMIT 1
+"""
+
+_STATUS_AT_SQL = """
+    SELECT status
+    FROM terrain_status_intervals
+    WHERE terrain_id = ? AND valid_from <= ?
+    ORDER BY valid_from DESC
+    LIMIT 1
+"""
+
+_DAILY_VIEW_SQL = """
+    SELECT terrain_id, ever_opened, snowfall_24hr
+    FROM daily_summary
+    WHERE date = ?
+    ORDER BY terrain_id
+"""
+
+_ALL_DATES_SQL = "SELECT DISTINCT date FROM daily_summary ORDER BY date DESC"
+
+_FULL_HISTORY_SQL = """
+    SELECT terrain_id, date, ever_opened, snowfall_24hr
+    FROM daily_summary
+    WHERE 1 {window}
+    ORDER BY date ASC, terrain_id ASC
+"""
+
+# The windowed calendar queries walk dates newest-first so LIMIT keeps the
+# most recent days; callers flip the rows back to ascending order.
+_SNOW_HISTORY_SQL = """
+    SELECT date, snowfall_24hr
+    FROM daily_summary
+    WHERE resort_id = :resort_id {window}
+    GROUP BY date
+    ORDER BY date DESC
+    {limit}
+"""
+
+_TERRAIN_HISTORY_SQL = """
+    SELECT date, ever_opened
+    FROM daily_summary
+    WHERE terrain_id = :terrain_id {window}
+    ORDER BY date DESC
+    {limit}
+"""
+
+_AVALANCHE_SQL = "SELECT * FROM avalanche_forecasts WHERE region = ? AND date = ?"
+
+_SEALED_DAY_SQL = "SELECT etag, body FROM sealed_days WHERE date = ? AND kind = ? AND format = ?"
+
+_CLOSED_STREAKS_SQL = """
+    WITH last_open AS (
+        SELECT id AS terrain_id,
+               (SELECT MAX(date) FROM daily_summary
+                WHERE terrain_id = terrain.id AND ever_opened = 1 AND date <= :date) AS date
+        FROM terrain
+        WHERE 1 {where}
+    ),
+    ranked AS (
+        SELECT d.terrain_id,
+               CAST(julianday(:date) - julianday(d.date) AS INTEGER) AS days_back,
+               ROW_NUMBER() OVER (PARTITION BY d.terrain_id ORDER BY d.date DESC) - 1 AS rn
+        FROM last_open o
+        CROSS JOIN daily_summary d  -- CROSS keeps terrain as the outer loop
+        WHERE d.terrain_id = o.terrain_id AND d.date > COALESCE(o.date, '') AND d.date <= :date
     )
-    today_row = c.fetchone()
-    if not today_row or today_row["ever_opened"] == 1:
-        conn.close()
-        return 0
+    SELECT terrain_id, COALESCE(MIN(CASE WHEN days_back != rn THEN rn END), COUNT(*)) AS streak
+    FROM ranked
+    GROUP BY terrain_id
+"""
 
-    # Count consecutive closed days going back from yesterday
-    streak = 1  # today counts as day 1
-    current = datetime.strptime(date_str, "%Y-%m-%d") - timedelta(days=1)
 
-    while True:
-        d = current.strftime("%Y-%m-%d")
-        c.execute(
-            "SELECT ever_opened FROM daily_summary WHERE resort = ? AND terrain_name = ? AND date = ?",
-            (resort, terrain_name, d),
-        )
-        row = c.fetchone()
-        if row is None or row["ever_opened"] == 1:
-            break
-        streak += 1
-        current -= timedelta(days=1)
+def _closed_streaks(c, date_str, terrain_id=None):
+    """Closed streaks for every terrain as of date_str, in a single query.
+
+    Only rows after each terrain's last open day (found through the partial
+    idx_daily_summary_opened index) can be part of its streak, so only those
+    are read. They are numbered newest-first; a row still belongs to the
+    streak while its distance in days from date_str equals its row number
+    (no missing day). The first row that breaks this ends the streak, so the
+    streak length is that row's number.
+    """
+    where = ""
+    params = {"date": date_str}
+    if terrain_id is not None:
+        where = "AND id = :terrain_id"
+        params["terrain_id"] = terrain_id
+    c.execute(_CLOSED_STREAKS_SQL.format(where=where), params)
+    return {row["terrain_id"]: row["streak"] for row in c.fetchall()}
 
-    conn.close()
-    return streak
+
+def get_closed_streak(resort, terrain_name, date_str):
+    with _connection() as conn:
+        terrain_id = _terrain_id(conn, resort, terrain_name)
+        if terrain_id is None:
+            return 0
+        c = conn.cursor()
+        streaks = _closed_streaks(c, date_str, terrain_id)
+    return streaks.get(terrain_id, 0)
 
 
 def get_daily_view(date_str):
-    conn = _connect()
-    c = conn.cursor()
-    c.execute(
-        "SELECT resort, terrain_name, ever_opened, snowfall_24hr FROM daily_summary WHERE date = ?",
-        (date_str,),
-    )
-    rows = c.fetchall()
-    conn.close()
+    with _connection() as conn:
+        c = conn.cursor()
+        c.execute(_DAILY_VIEW_SQL, (date_str,))
+        rows = c.fetchall()
+        streaks = _closed_streaks(c, date_str) if rows else {}
 
-    result = {}
-    for row in rows:
-        resort = row["resort"]
-        if resort not in result:
-            result[resort] = []
-        result[resort].append({
-            "terrain_name": row["terrain_name"],
-            "ever_opened": row["ever_opened"],
-            "snowfall_24hr": row["snowfall_24hr"],
-            "closed_streak": get_closed_streak(resort, row["terrain_name"], date_str),
-        })
+        result = {}
+        for row in rows:
+            resort, terrain_name = _terrain_key(conn, row["terrain_id"])
+            if resort not in result:
+                result[resort] = []
+            result[resort].append({
+                "terrain_name": terrain_name,
+                "ever_opened": row["ever_opened"],
+                "snowfall_24hr": row["snowfall_24hr"],
+                "closed_streak": streaks.get(row["terrain_id"], 0),
+            })
 
     return result
 
 
+_HISTORY_FINGERPRINT_SQL = """
+    SELECT COUNT(*) AS n, MAX(date) AS last, SUM(ever_opened) AS opened,
+           SUM(CAST(snowfall_24hr * 100 AS INTEGER)) AS snow
+    FROM daily_summary
+"""
+
+
+def get_history_fingerprint():
+    """(row count, latest date, opened cells, snowfall in hundredths) used to spot a stale history pivot.
+
+    The sums catch cells changed in place (a run 0 -> 1, a new snowfall
+    reading) that a count alone would miss.
+    """
+    with _connection() as conn:
+        row = conn.execute(_HISTORY_FINGERPRINT_SQL).fetchone()
+    return [row["n"], row["last"], row["opened"] or 0, row["snow"] or 0]
+
+
 def get_all_dates():
-    conn = _connect()
-    c = conn.cursor()
-    c.execute("SELECT DISTINCT date FROM daily_summary ORDER BY date DESC")
-    dates = [row["date"] for row in c.fetchall()]
-    conn.close()
+    with _connection() as conn:
+        c = conn.cursor()
+        c.execute(_ALL_DATES_SQL)
+        dates = [row["date"] for row in c.fetchall()]
     return dates
 
 
-def get_full_history():
-    """Returns all terrain open/closed data across all dates for the spreadsheet view."""
-    conn = _connect()
-    c = conn.cursor()
-    c.execute("""
-        SELECT resort, terrain_name, date, ever_opened, snowfall_24hr
-        FROM daily_summary
-        ORDER BY date ASC
-    """)
-    rows = c.fetchall()
-    conn.close()
+def _date_window(params, start=None, end=None, limit=None):
+    """SQL fragments limiting a query to dates in [start, end] and `limit` rows."""
+    window = ""
+    if start:
+        window += " AND date >= :start"
+        params["start"] = start
+    if end:
+        window += " AND date <= :end"
+        params["end"] = end
+    limit_sql = ""
+    if limit:
+        limit_sql = "LIMIT :limit"
+        params["limit"] = limit
+    return {"window": window, "limit": limit_sql}
 
-    dates = []
-    date_set = set()
-    terrain_map = {}
-    snow_map = {}  # {resort: {date: snowfall_24hr}}
 
-    for row in rows:
-        d = row["date"]
-        resort = row["resort"]
-        if d not in date_set:
-            date_set.add(d)
-            dates.append(d)
-        key = f'{resort}|{row["terrain_name"]}'
-        if key not in terrain_map:
-            terrain_map[key] = {}
-        terrain_map[key][d] = row["ever_opened"]
-
-        # Track snow per resort per date (all terrain rows share same value)
-        if resort not in snow_map:
-            snow_map[resort] = {}
-        if d not in snow_map[resort]:
-            snow_map[resort][d] = row["snowfall_24hr"]
+def get_full_history(start=None, end=None):
+    """Returns terrain open/closed data for the spreadsheet view (all dates by default)."""
+    params = {}
+    sql = _FULL_HISTORY_SQL.format(**_date_window(params, start, end))
+    with _connection() as conn:
+        c = conn.cursor()
+        c.execute(sql, params)
+        rows = c.fetchall()
+
+        dates = []
+        date_set = set()
+        terrain_map = {}
+        snow_map = {}  # {resort: {date: snowfall_24hr}}
+
+        for row in rows:
+            d = row["date"]
+            resort, terrain_name = _terrain_key(conn, row["terrain_id"])
+            if d not in date_set:
+                date_set.add(d)
+                dates.append(d)
+            key = f"{resort}|{terrain_name}"
+            if key not in terrain_map:
+                terrain_map[key] = {}
+            terrain_map[key][d] = row["ever_opened"]
+
+            # Track snow per resort per date (all terrain rows share same value)
+            if resort not in snow_map:
+                snow_map[resort] = {}
+            if d not in snow_map[resort]:
+                snow_map[resort][d] = row["snowfall_24hr"]
 
     return {"dates": dates, "terrain": terrain_map, "snow": snow_map}
 
 
-def get_resort_snow_history(resort):
-    """Returns daily snowfall history for a resort (one value per date)."""
-    conn = _connect()
-    c = conn.cursor()
-    c.execute("""
-        SELECT date, snowfall_24hr
-        FROM daily_summary
-        WHERE resort = ?
-        GROUP BY date
-        ORDER BY date ASC
-    """, (resort,))
-    rows = c.fetchall()
-    conn.close()
-    return {row["date"]: row["snowfall_24hr"] for row in rows}
+def get_resort_snow_history(resort, start=None, end=None, limit=None):
+    """Returns daily snowfall history for a resort (one value per date).
+
+    start/end bound the dates (inclusive); limit keeps only the most recent days.
+    """
+    params = {}
+    sql = _SNOW_HISTORY_SQL.format(**_date_window(params, start, end, limit))
+    with _connection() as conn:
+        params["resort_id"] = _resort_id(conn, resort)
+        c = conn.cursor()
+        c.execute(sql, params)
+        rows = c.fetchall()
+    return {row["date"]: row["snowfall_24hr"] for row in reversed(rows)}
 
 
 def save_avalanche_forecast(region, date_str, overall_danger, bottom_line, forecast_json, fetched_at):
-    conn = _connect()
-    conn.execute(
-        """INSERT OR REPLACE INTO avalanche_forecasts
-           (region, date, overall_danger, bottom_line, forecast_json, fetched_at)
-           VALUES (?, ?, ?, ?, ?, ?)""",
-        (region, date_str, overall_danger, bottom_line, forecast_json, fetched_at),
-    )
-    conn.commit()
-    conn.close()
+    with _connection() as conn:
+        conn.execute(
+            """INSERT OR REPLACE INTO avalanche_forecasts
+               (region, date, overall_danger, bottom_line, forecast_json, fetched_at)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (region, date_str, overall_danger, bottom_line, forecast_json, fetched_at),
+        )
+        _unseal(conn, date_str, "avalanche")
+        _bump_data_version(conn)
 
 
 def get_avalanche_forecast(region, date_str):
-    conn = _connect()
-    c = conn.cursor()
-    c.execute("SELECT * FROM avalanche_forecasts WHERE region = ? AND date = ?", (region, date_str))
-    row = c.fetchone()
-    conn.close()
+    with _connection() as conn:
+        c = conn.cursor()
+        c.execute(_AVALANCHE_SQL, (region, date_str))
+        row = c.fetchone()
     if not row:
         return None
     return {
@@ -243,16 +805,359 @@ def get_avalanche_forecast(region, date_str):
     }
 
 
-def get_terrain_history(resort, terrain_name):
-    """Returns one terrain's full open/closed history for the calendar view."""
-    conn = _connect()
-    c = conn.cursor()
-    c.execute("""
-        SELECT date, ever_opened
-        FROM daily_summary
-        WHERE resort = ? AND terrain_name = ?
-        ORDER BY date ASC
-    """, (resort, terrain_name))
-    rows = c.fetchall()
-    conn.close()
-    return {row["date"]: row["ever_opened"] for row in rows}
+def _unseal(conn, date_str, kind):
+    # A late write (e.g. a manual scrape after the day was sealed) voids the seal
+    conn.execute("DELETE FROM sealed_days WHERE date = ? AND kind = ?", (date_str, kind))
+
+
+def save_sealed_day(date_str, kind, fmt, etag, body, sealed_at, data_version):
+    """Store a sealed payload unless data changed since it was rendered at data_version.
+
+    Returns True if it was stored.
+    """
+    with _connection() as conn:
+        cur = conn.execute(
+            """INSERT OR REPLACE INTO sealed_days (date, kind, format, etag, body, sealed_at)
+               SELECT ?, ?, ?, ?, ?, ?
+               WHERE (SELECT value FROM meta WHERE key = 'data_version') = ?""",
+            (date_str, kind, fmt, etag, body, sealed_at, data_version),
+        )
+        return cur.rowcount == 1
+
+
+def get_sealed_day(date_str, kind, fmt):
+    """Return (etag, gzipped body) for a sealed payload in format fmt, or None."""
+    with _connection() as conn:
+        row = conn.execute(_SEALED_DAY_SQL, (date_str, kind, fmt)).fetchone()
+    return (row["etag"], row["body"]) if row else None
+
+
+def get_unsealed_dates(kind, fmt, before_date):
+    """Dates with terrain or avalanche data before before_date lacking a current seal."""
+    with _connection() as conn:
+        rows = conn.execute("""
+            SELECT date FROM (
+                SELECT DISTINCT date FROM daily_summary WHERE date < :before
+                UNION
+                SELECT date FROM avalanche_forecasts WHERE date < :before
+            )
+            WHERE date NOT IN (SELECT date FROM sealed_days WHERE kind = :kind AND format = :fmt)
+            ORDER BY date
+        """, {"before": before_date, "kind": kind, "fmt": fmt}).fetchall()
+    return [row["date"] for row in rows]
+
+
+def get_http_validator(key):
+    """Stored validators for a fetch key: dict with etag, last_modified, body_hash, parsed; or None."""
+    with _connection() as conn:
+        row = conn.execute(
+            "SELECT etag, last_modified, body_hash, parsed FROM http_validators WHERE key = ?", (key,)
+        ).fetchone()
+    return dict(row) if row else None
+
+
+def save_http_validator(key, url, etag, last_modified, body_hash, parsed, checked_at):
+    """Record a changed body that was parsed (and stored) successfully."""
+    with _connection() as conn:
+        conn.execute(
+            """INSERT INTO http_validators (key, url, etag, last_modified, body_hash, parsed, fetches, checked_at)
+               VALUES (?, ?, ?, ?, ?, ?, 1, ?)
+               ON CONFLICT(key) DO UPDATE SET
+                   url = excluded.url, etag = excluded.etag, last_modified = excluded.last_modified,
+                   body_hash = excluded.body_hash, parsed = excluded.parsed,
+                   fetches = fetches + 1, checked_at = excluded.checked_at""",
+            (key, url, etag, last_modified, body_hash, parsed, checked_at),
+        )
+
+
+def note_http_unchanged(key, checked_at):
+    with _connection() as conn:
+        conn.execute(
+            """UPDATE http_validators SET fetches = fetches + 1, unchanged = unchanged + 1, checked_at = ?
+               WHERE key = ?""",
+            (checked_at, key),
+        )
+
+
+def get_http_validator_stats():
+    """Per-URL fetch and unchanged counts, summed over keys."""
+    with _connection() as conn:
+        rows = conn.execute(
+            """SELECT url, SUM(fetches) AS fetches, SUM(unchanged) AS unchanged, MAX(checked_at) AS checked_at
+               FROM http_validators GROUP BY url ORDER BY url"""
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def save_scrape_run(started_at, duration_s, resorts, failed, cells_changed, timings,
+                    finished_at=None, trigger=None, results=None, job_id=None):
+    """Record one scrape run (timings: {"resort.phase": seconds}) and drop the oldest beyond SCRAPE_RUNS_KEEP."""
+    with _connection() as conn:
+        cur = conn.execute(
+            """INSERT INTO scrape_runs
+                   (started_at, duration_s, resorts, failed, cells_changed, timings, finished_at, trigger, results,
+                    job_id)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (started_at, duration_s, resorts, failed, cells_changed, json.dumps(timings, sort_keys=True),
+             finished_at, trigger, json.dumps(results) if results is not None else None, job_id),
+        )
+        conn.execute("DELETE FROM scrape_runs WHERE id <= ?", (cur.lastrowid - SCRAPE_RUNS_KEEP,))
+
+
+def get_scrape_runs(limit=100, since=None):
+    """Most recent scrape runs first (only those started at or after `since`), timings and results decoded."""
+    with _connection() as conn:
+        if since is None:
+            rows = conn.execute("SELECT * FROM scrape_runs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT * FROM scrape_runs WHERE started_at >= ? ORDER BY id DESC LIMIT ?", (since, limit)
+            ).fetchall()
+    runs = []
+    for row in rows:
+        run = dict(row)
+        run["timings"] = json.loads(run["timings"])
+        run["results"] = json.loads(run["results"]) if run["results"] else None
+        runs.append(run)
+    return runs
+
+
+def get_status_at(resort, terrain_name, instant):
+    """Status of a terrain at a past instant, or None before the first scrape.
+
+    instant is an ISO timestamp in the same Mountain-time format as
+    scraped_at. Between scrapes the last observed status holds, matching what
+    the raw per-scrape snapshots used to answer.
+    """
+    with _connection() as conn:
+        terrain_id = _terrain_id(conn, resort, terrain_name)
+        row = conn.execute(_STATUS_AT_SQL, (terrain_id, instant)).fetchone()
+    return row["status"] if row else None
+
+
+def get_terrain_history(resort, terrain_name, start=None, end=None, limit=None):
+    """Returns one terrain's open/closed history for the calendar view.
+
+    start/end bound the dates (inclusive); limit keeps only the most recent days.
+    """
+    params = {}
+    sql = _TERRAIN_HISTORY_SQL.format(**_date_window(params, start, end, limit))
+    with _connection() as conn:
+        params["terrain_id"] = _terrain_id(conn, resort, terrain_name)
+        c = conn.cursor()
+        c.execute(sql, params)
+        rows = c.fetchall()
+    return {row["date"]: row["ever_opened"] for row in reversed(rows)}
+
+
+# Queries served on every API request, with representative parameters.
+# check_query_plans() fails if any of them has to scan a whole table.
+HOT_QUERIES = {
+    "daily_view": (_DAILY_VIEW_SQL, ("2026-01-01",)),
+    "closed_streaks": (_CLOSED_STREAKS_SQL.format(where=""), {"date": "2026-01-01"}),
+    "all_dates": (_ALL_DATES_SQL, ()),
+    "full_history": (_FULL_HISTORY_SQL.format(window=""), ()),
+    "history_window": (
+        _FULL_HISTORY_SQL.format(window=" AND date >= :start AND date <= :end"),
+        {"start": "2026-01-01", "end": "2026-01-31"},
+    ),
+    "snow_history": (_SNOW_HISTORY_SQL.format(window="", limit=""), {"resort_id": 1}),
+    "snow_window": (
+        _SNOW_HISTORY_SQL.format(window=" AND date >= :start AND date <= :end", limit="LIMIT 31"),
+        {"resort_id": 1, "start": "2026-01-01", "end": "2026-01-31"},
+    ),
+    "terrain_history": (_TERRAIN_HISTORY_SQL.format(window="", limit=""), {"terrain_id": 1}),
+    "terrain_window": (
+        _TERRAIN_HISTORY_SQL.format(window=" AND date >= :start AND date <= :end", limit="LIMIT 31"),
+        {"terrain_id": 1, "start": "2026-01-01", "end": "2026-01-31"},
+    ),
+    "avalanche": (_AVALANCHE_SQL, ("salt-lake", "2026-01-01")),
+    "sealed_day": (_SEALED_DAY_SQL, ("2026-01-01", "status", 1)),
+    "latest_interval": (_LATEST_INTERVAL_SQL, (1,)),
+}
+
+
+def check_query_plans():
+    """Return {query name: plan detail} for every hot query that scans a table.
+
+    A SCAN through a covering index is fine (it never touches the table);
+    a bare "SCAN <table>" means the query fell back to a full table scan.
+    The lookup tables (a row per resort or terrain) are small enough to scan.
+    """
+    problems = {}
+    with _connection() as conn:
+        tables = {row["name"] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        tables -= {"resorts", "terrain"}
+        for name, (sql, params) in HOT_QUERIES.items():
+            for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params):
+                detail = row["detail"]
+                m = re.match(r"SCAN (?:TABLE )?(\w+)", detail)
+                if m and m.group(1) in tables and "USING" not in detail:
+                    problems[name] = detail
+    return problems
+
+
+def get_resort_health():
+    """{resort: health row} for every resort the circuit breaker has seen."""
+    with _connection() as conn:
+        rows = conn.execute("SELECT * FROM resort_health ORDER BY resort").fetchall()
+    return {row["resort"]: dict(row) for row in rows}
+
+
+def save_resort_health(row):
+    """Insert or replace one resort's health row (a dict with resort_health's columns)."""
+    columns = ("resort", "consecutive_failures", "last_error", "last_latency_s",
+               "last_success_at", "last_failure_at", "open_until", "skipped")
+    with _connection() as conn:
+        conn.execute(
+            f"INSERT OR REPLACE INTO resort_health ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            tuple(row.get(c) for c in columns),
+        )
+
+
+def acquire_scrape_lease(holder, pid, trigger, started_at, expires_at, now, stale_holder=None, job_id=None):
+    """Take the scrape lease if it is free, expired or held by stale_holder; returns True if taken."""
+    with _connection() as conn:
+        cur = conn.execute(
+            """INSERT INTO scrape_lease (id, holder, pid, trigger, started_at, expires_at, job_id)
+               VALUES (1, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(id) DO UPDATE SET
+                   holder = excluded.holder, pid = excluded.pid, trigger = excluded.trigger,
+                   started_at = excluded.started_at, expires_at = excluded.expires_at, job_id = excluded.job_id
+               WHERE scrape_lease.holder IS NULL OR scrape_lease.expires_at < ? OR scrape_lease.holder = ?""",
+            (holder, pid, trigger, started_at, expires_at, job_id, now, stale_holder),
+        )
+        return cur.rowcount == 1
+
+
+def renew_scrape_lease(holder, expires_at):
+    with _connection() as conn:
+        cur = conn.execute("UPDATE scrape_lease SET expires_at = ? WHERE holder = ?", (expires_at, holder))
+        return cur.rowcount == 1
+
+
+def release_scrape_lease(holder):
+    with _connection() as conn:
+        conn.execute("UPDATE scrape_lease SET holder = NULL, expires_at = NULL WHERE holder = ?", (holder,))
+
+
+def get_scrape_lease():
+    """The lease row while a scrape holds it, else None (expiry is the caller's to judge)."""
+    with _connection() as conn:
+        row = conn.execute("SELECT * FROM scrape_lease WHERE id = 1 AND holder IS NOT NULL").fetchone()
+    return dict(row) if row else None
+
+
+def create_scrape_job(job_id, trigger, created_at, for_leader=False):
+    """Add a queued job and drop the oldest beyond SCRAPE_JOBS_KEEP.
+
+    for_leader leaves the job for the scheduler leader to claim and run.
+    """
+    with _connection() as conn:
+        cur = conn.execute(
+            "INSERT INTO scrape_jobs (id, trigger, status, created_at, for_leader) VALUES (?, ?, 'queued', ?, ?)",
+            (job_id, trigger, created_at, int(for_leader)),
+        )
+        cutoff = cur.lastrowid - SCRAPE_JOBS_KEEP
+        conn.execute(
+            "DELETE FROM scrape_job_resorts WHERE job_id IN (SELECT id FROM scrape_jobs WHERE rowid <= ?)", (cutoff,)
+        )
+        conn.execute("DELETE FROM scrape_jobs WHERE rowid <= ?", (cutoff,))
+
+
+def update_scrape_job(job_id, **fields):
+    """Set columns of a job (status, started_at, finished_at, joined_job_id, cells_changed, error)."""
+    with _connection() as conn:
+        conn.execute(
+            f"UPDATE scrape_jobs SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ?",
+            (*fields.values(), job_id),
+        )
+
+
+def claim_scrape_job():
+    """Take the oldest queued job left for the leader; returns its row, or None if there is none."""
+    with _connection() as conn:
+        row = conn.execute(
+            "SELECT * FROM scrape_jobs WHERE for_leader = 1 AND status = 'queued' ORDER BY rowid LIMIT 1"
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE scrape_jobs SET for_leader = 0 WHERE id = ?", (row["id"],))
+    return dict(row)
+
+
+def request_scrape_job_cancel(job_id):
+    """Flag a queued or running job for cancellation; returns False if it is missing or already over."""
+    with _connection() as conn:
+        cur = conn.execute(
+            "UPDATE scrape_jobs SET cancel_requested = 1 WHERE id = ? AND status IN ('queued', 'running')",
+            (job_id,),
+        )
+        return cur.rowcount == 1
+
+
+def scrape_job_cancel_requested(job_id):
+    with _connection() as conn:
+        row = conn.execute("SELECT cancel_requested FROM scrape_jobs WHERE id = ?", (job_id,)).fetchone()
+    return bool(row and row["cancel_requested"])
+
+
+def save_scrape_job_resort(job_id, resort, state, started_at=None, seconds=None, error=None, result=None):
+    """Record a resort's progress in a job; started_at is kept from the "running" update."""
+    with _connection() as conn:
+        conn.execute(
+            """INSERT INTO scrape_job_resorts (job_id, resort, state, started_at, seconds, error, result)
+               VALUES (?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(job_id, resort) DO UPDATE SET
+                   state = excluded.state, started_at = COALESCE(excluded.started_at, started_at),
+                   seconds = excluded.seconds, error = excluded.error, result = excluded.result""",
+            (job_id, resort, state, started_at, seconds, error, json.dumps(result) if result is not None else None),
+        )
+
+
+def close_scrape_job_resorts(job_id, state):
+    """Give resorts still pending or running in an ended job a final state."""
+    with _connection() as conn:
+        conn.execute(
+            "UPDATE scrape_job_resorts SET state = ? WHERE job_id = ? AND state IN ('pending', 'running')",
+            (state, job_id),
+        )
+
+
+def get_scrape_job(job_id):
+    """A job with its per-resort rows (results decoded), or None."""
+    with _connection() as conn:
+        row = conn.execute("SELECT * FROM scrape_jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        resorts = conn.execute(
+            "SELECT * FROM scrape_job_resorts WHERE job_id = ? ORDER BY rowid", (job_id,)
+        ).fetchall()
+    job = dict(row)
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    job["resorts"] = {}
+    for r in resorts:
+        entry = dict(r)
+        del entry["job_id"], entry["resort"]
+        entry["result"] = json.loads(entry["result"]) if entry["result"] else None
+        job["resorts"][r["resort"]] = entry
+    return job
+
+
+def get_scrape_jobs(limit=20):
+    """Most recent jobs first, without per-resort rows."""
+    with _connection() as conn:
+        rows = conn.execute("SELECT * FROM scrape_jobs ORDER BY rowid DESC LIMIT ?", (limit,)).fetchall()
+    return [dict(row, cancel_requested=bool(row["cancel_requested"])) for row in rows]
+
+
+if __name__ == "__main__":
+    import sys
+
+    init_db()
+    bad = check_query_plans()
+    for name, detail in bad.items():
+        print(f"[db] {name}: {detail}")
+    if bad:
+        sys.exit(1)
+    print(f"[db] All {len(HOT_QUERIES)} hot queries use an index.")
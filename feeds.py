@@ -0,0 +1,232 @@
+"""HTTP-first resort data: call a resort's JSON feed directly instead of rendering its page.
+
+Most resort pages fill their lift/trail tables from an XHR. capture() loads a
+page in Playwright, records the JSON responses it makes and works out which
+one carries the tracked terrain (and which field holds the 24h snow). The
+resulting spec is saved to FEEDS_PATH. scrape_all() then calls fetch() for
+every resort with a spec, over the shared pooled session in fetch.py. Any error, including a feed
+whose schema no longer matches the spec, raises FeedError, and the caller
+falls back to the Playwright scraper.
+
+Spec shape, per resort:
+    {"terrain": {"url": ..., "name_key": ..., "status_key": ...},
+     "snow": {"url": ..., "path": [key or index, ...]}}
+"""
+
+import json
+import os
+import re
+
+import requests
+
+from database import DB_DIR
+from fetch import session
+
+FEEDS_PATH = os.path.join(DB_DIR, "feeds.json")
+FEED_TIMEOUT = 15
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "application/json, text/plain, */*",
+}
+
+SNOW_KEY_RE = re.compile(r"(?:24.?(?:h|hour|hr)|snow.?24|new.?snow|overnight)", re.IGNORECASE)
+
+
+class FeedError(Exception):
+    """The feed is unreachable or no longer matches its spec."""
+
+
+def log(msg):
+    print(msg, flush=True)
+
+
+def load_specs():
+    try:
+        with open(FEEDS_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _status(value):
+    """Map a feed status value to open/pending/closed, or raise FeedError."""
+    if isinstance(value, bool):
+        return "open" if value else "closed"
+    if isinstance(value, str) and value.strip():
+        raw = value.strip().lower()
+        if "open" in raw:
+            return "open"
+        if "pending" in raw or "hold" in raw or "delayed" in raw:
+            return "pending"
+        if "close" in raw:
+            return "closed"
+    raise FeedError(f"unrecognised status {value!r}")
+
+
+def _dicts(node):
+    """Every dict in a JSON document, depth first."""
+    if isinstance(node, dict):
+        yield node
+        children = node.values()
+    elif isinstance(node, list):
+        children = node
+    else:
+        return
+    for child in children:
+        yield from _dicts(child)
+
+
+def _get_json(url):
+    try:
+        resp = session.get(url, headers=HEADERS, timeout=FEED_TIMEOUT)
+        resp.raise_for_status()
+        return resp.json()
+    except (requests.RequestException, ValueError) as e:
+        raise FeedError(f"{url}: {e}") from e
+
+
+def _follow(doc, path):
+    for step in path:
+        try:
+            doc = doc[step]
+        except (KeyError, IndexError, TypeError):
+            raise FeedError(f"snow path {path} not found")
+    try:
+        return float(doc)
+    except (TypeError, ValueError):
+        raise FeedError(f"snow value {doc!r} is not a number")
+
+
+def parse_terrain(doc, spec, tracked):
+    """Pull {tracked name: status} out of a feed document, or raise FeedError."""
+    wanted = {name.lower(): name for name in tracked}
+    found = {}
+    for item in _dicts(doc):
+        name = item.get(spec["name_key"])
+        if not isinstance(name, str):
+            continue
+        for key, tracked_name in wanted.items():
+            if key in name.lower() and spec["status_key"] in item:
+                found[tracked_name] = _status(item[spec["status_key"]])
+    missing = set(tracked) - set(found)
+    if missing:
+        raise FeedError(f"tracked terrain missing from feed: {sorted(missing)}")
+    return found
+
+
+def fetch(resort, spec, tracked):
+    """Scrape a resort from its feed; returns the scraper's {"snow_24hr", "terrain"} shape."""
+    docs = {}
+    for part in ("terrain", "snow"):
+        url = spec[part]["url"]
+        if url not in docs:
+            docs[url] = _get_json(url)
+    terrain = parse_terrain(docs[spec["terrain"]["url"]], spec["terrain"], tracked)
+    snow_24hr = _follow(docs[spec["snow"]["url"]], spec["snow"]["path"])
+    log(f"[{resort}] Feed done. Terrain: {terrain}, Snow: {snow_24hr}")
+    return {
+        "snow_24hr": snow_24hr,
+        "terrain": [{"name": n, "status": terrain[n]} for n in tracked],
+    }
+
+
+# --- Capture mode ---------------------------------------------------------
+
+def _find_terrain_spec(doc, tracked):
+    """Guess name_key/status_key from a document that names the tracked terrain."""
+    wanted = [name.lower() for name in tracked]
+    for item in _dicts(doc):
+        for name_key, value in item.items():
+            if not isinstance(value, str) or not any(w in value.lower() for w in wanted):
+                continue
+            for status_key, status in item.items():
+                if status_key == name_key:
+                    continue
+                try:
+                    _status(status)
+                except FeedError:
+                    continue
+                spec = {"name_key": name_key, "status_key": status_key}
+                try:
+                    parse_terrain(doc, spec, tracked)
+                except FeedError:
+                    continue
+                return spec
+    return None
+
+
+def _find_snow_path(node, path=()):
+    """Path to the first numeric value under a 24h-snow-looking key."""
+    if isinstance(node, dict):
+        items = node.items()
+    elif isinstance(node, list):
+        items = enumerate(node)
+    else:
+        return None
+    for key, value in items:
+        if isinstance(key, str) and SNOW_KEY_RE.search(key) and isinstance(value, (int, float)) \
+                and not isinstance(value, bool):
+            return list(path) + [key]
+        found = _find_snow_path(value, path + (key,))
+        if found:
+            return found
+    return None
+
+
+def capture(resort, page_urls, tracked, browser, save=False):
+    """Record the JSON traffic of a resort's pages and derive a feed spec from it.
+
+    Returns (spec or None, [captured calls]). With save=True a complete spec
+    is written to FEEDS_PATH.
+    """
+    calls = []
+    context = browser.new_context(user_agent=HEADERS["User-Agent"])
+
+    def on_response(response):
+        if response.request.resource_type not in ("xhr", "fetch"):
+            return
+        if "json" not in response.headers.get("content-type", ""):
+            return
+        try:
+            calls.append({"url": response.url, "status": response.status, "json": response.json()})
+        except Exception:
+            pass
+
+    context.on("response", on_response)
+    try:
+        page = context.new_page()
+        for url in page_urls:
+            try:
+                page.goto(url, timeout=60000)
+                page.wait_for_load_state("networkidle", timeout=30000)
+            except Exception as e:
+                log(f"[{resort}] Capture load error on {url}: {e}")
+    finally:
+        context.close()
+
+    spec = {}
+    for call in calls:
+        if "terrain" not in spec:
+            terrain = _find_terrain_spec(call["json"], tracked)
+            if terrain:
+                spec["terrain"] = {"url": call["url"], **terrain}
+        if "snow" not in spec:
+            path = _find_snow_path(call["json"])
+            if path:
+                spec["snow"] = {"url": call["url"], "path": path}
+    log(f"[{resort}] Captured {len(calls)} JSON calls; "
+        f"terrain feed: {spec.get('terrain', {}).get('url')}, snow feed: {spec.get('snow', {}).get('url')}")
+
+    if len(spec) < 2:
+        return None, [{"url": c["url"], "status": c["status"]} for c in calls]
+    if save:
+        specs = load_specs()
+        specs[resort] = spec
+        os.makedirs(DB_DIR, exist_ok=True)
+        tmp = FEEDS_PATH + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(specs, f, indent=2)
+        os.replace(tmp, FEEDS_PATH)
+        log(f"[{resort}] Saved feed spec to {FEEDS_PATH}")
+    return spec, [{"url": c["url"], "status": c["status"]} for c in calls]
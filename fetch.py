@@ -0,0 +1,106 @@
+"""Shared HTTP session with conditional, content-hash-aware GETs.
+
+Every plain-HTTP fetch (Snowbasin, the UAC forecast, resort feeds) goes
+through one pooled requests.Session, so repeated calls reuse keep-alive
+connections. conditional_get() also sends the validators stored for a URL
+(ETag / Last-Modified) and hashes the body. A 304, or a 200 whose body hashes
+the same as last time, comes back as unchanged with the value parsed from
+that body, and the caller skips its parse (and, for the avalanche forecast,
+its DB write). Validators are only
+stored through Fetched.remember(), once the caller has handled a changed body,
+so a failed parse is retried on the next fetch.
+"""
+
+import hashlib
+import json
+import threading
+from datetime import datetime
+
+import pytz
+import requests
+from requests.adapters import HTTPAdapter
+
+from database import get_http_validator, save_http_validator, note_http_unchanged
+import metrics
+
+MTN_TZ = pytz.timezone("America/Denver")
+
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=8, pool_maxsize=8)
+session.mount("https://", _adapter)
+session.mount("http://", _adapter)
+
+# Off while recording or replaying fixtures, so every fetch returns a full body
+USE_VALIDATORS = True
+
+# This process's counts; http_validators keeps the all-time per-URL totals
+stats = {"fetches": 0, "not_modified": 0, "same_body": 0, "changed": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(outcome):
+    with _stats_lock:
+        stats["fetches"] += 1
+        stats[outcome] += 1
+    # Also a counter, so a scrape worker's fetches reach /api/metrics through metrics.absorb()
+    metrics.inc("http_fetch_total", outcome=outcome)
+
+
+class Fetched:
+    """Result of conditional_get(): either a changed response or the last parse of an unchanged one."""
+
+    def __init__(self, key, url, response, body_hash, unchanged, parsed=None):
+        self.key = key
+        self.url = url
+        self.response = response
+        self.body_hash = body_hash
+        self.unchanged = unchanged
+        self.parsed = parsed
+
+    def remember(self, parsed):
+        """Store this response's validators and what the caller parsed from it (JSON-serializable)."""
+        if not USE_VALIDATORS:
+            return
+        save_http_validator(
+            self.key, self.url,
+            self.response.headers.get("ETag"), self.response.headers.get("Last-Modified"),
+            self.body_hash, json.dumps(parsed), datetime.now(MTN_TZ).isoformat(),
+        )
+
+
+def conditional_get(url, key=None, headers=None, timeout=15):
+    """GET url, answering from the validator store when the body hasn't changed.
+
+    key scopes the stored validators (default: the URL). Callers whose parse
+    depends on more than the body, such as the current date, fold that into
+    the key. Raises requests exceptions like requests.get().
+    """
+    key = key or url
+    if not USE_VALIDATORS:
+        resp = session.get(url, headers=headers, timeout=timeout)
+        resp.raise_for_status()
+        return Fetched(key, url, resp, None, unchanged=False)
+    stored = get_http_validator(key)
+    if stored is not None and stored["parsed"] is None:
+        stored = None
+    send = dict(headers or {})
+    if stored is not None:
+        if stored["etag"]:
+            send["If-None-Match"] = stored["etag"]
+        if stored["last_modified"]:
+            send["If-Modified-Since"] = stored["last_modified"]
+
+    resp = session.get(url, headers=send, timeout=timeout)
+    if resp.status_code == 304 and stored is not None:
+        outcome = "not_modified"
+        body_hash = stored["body_hash"]
+    else:
+        resp.raise_for_status()
+        body_hash = hashlib.sha256(resp.content).hexdigest()
+        outcome = "same_body" if stored is not None and stored["body_hash"] == body_hash else "changed"
+
+    _count(outcome)
+    if outcome == "changed":
+        return Fetched(key, url, resp, body_hash, unchanged=False)
+    note_http_unchanged(key, datetime.now(MTN_TZ).isoformat())
+    return Fetched(key, url, resp, body_hash, unchanged=True, parsed=json.loads(stored["parsed"]))
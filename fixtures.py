@@ -0,0 +1,228 @@
+"""Record and replay scraper traffic for offline runs.
+
+A recording is a versioned directory under FIXTURES_DIR:
+    <version>/manifest.json   format, recorded_at, resorts
+    <version>/results.json    what scrape_all() returned while recording
+    <version>/har/<resort>.har     every request the resort's browser context made
+    <version>/html/<resort>.html   final page HTML (+ .txt with its innerText)
+    <version>/http/<sha1(url)>.json  plain-HTTP responses (Snowbasin, UAC, feeds)
+
+record() and replay() switch the process into either mode: browser contexts
+record or replay a HAR (see context_options() / attach()), and the shared
+requests session in fetch.py saves responses or is served from disk. Replay
+never touches the network; anything not in the recording fails.
+"""
+
+import base64
+import hashlib
+import json
+import os
+from datetime import datetime
+
+import pytz
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+import fetch
+import health
+
+MTN_TZ = pytz.timezone("America/Denver")
+
+FIXTURES_DIR = os.environ.get(
+    "SCRAPE_FIXTURES_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+)
+FORMAT = 1
+
+_mode = None  # "record" or "replay"
+_dir = None
+
+
+def log(msg):
+    print(msg, flush=True)
+
+
+def versions():
+    """Recorded versions, oldest first."""
+    try:
+        return sorted(
+            name for name in os.listdir(FIXTURES_DIR)
+            if os.path.exists(os.path.join(FIXTURES_DIR, name, "manifest.json"))
+        )
+    except FileNotFoundError:
+        return []
+
+
+def _path(*parts):
+    return os.path.join(_dir, *parts)
+
+
+def _http_file(url):
+    return _path("http", hashlib.sha1(url.encode()).hexdigest() + ".json")
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def _save_response(response, *args, **kwargs):
+    _write_json(_http_file(response.url), {
+        "url": response.url,
+        "status": response.status_code,
+        "headers": dict(response.headers),
+        "body": base64.b64encode(response.content).decode(),
+    })
+
+
+class ReplayAdapter(BaseAdapter):
+    """Answers requests from the recording's http/ directory."""
+
+    def send(self, request, **kwargs):
+        try:
+            with open(_http_file(request.url)) as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            raise requests.ConnectionError(f"no fixture for {request.url}")
+        response = requests.Response()
+        response.status_code = saved["status"]
+        response.headers = CaseInsensitiveDict(saved["headers"])
+        # The body is stored decoded, so drop any transfer encoding
+        response.headers.pop("Content-Encoding", None)
+        response._content = base64.b64decode(saved["body"])
+        response._content_consumed = True
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def record(version=None):
+    """Start recording into FIXTURES_DIR/<version> (default: a timestamp)."""
+    global _mode, _dir
+    version = version or datetime.now(MTN_TZ).strftime("%Y%m%dT%H%M%S")
+    _dir = os.path.join(FIXTURES_DIR, version)
+    os.makedirs(_dir, exist_ok=True)
+    _mode = "record"
+    fetch.USE_VALIDATORS = False
+    health.ENABLED = False
+    fetch.session.hooks["response"].append(_save_response)
+    log(f"[fixtures] Recording to {_dir}")
+    return version
+
+
+def replay(version=None):
+    """Serve all scraper traffic from a recording (default: the newest)."""
+    global _mode, _dir
+    if version is None:
+        recorded = versions()
+        if not recorded:
+            raise FileNotFoundError(f"no fixtures in {FIXTURES_DIR}")
+        version = recorded[-1]
+    _dir = os.path.join(FIXTURES_DIR, version)
+    if not os.path.exists(_path("manifest.json")):
+        raise FileNotFoundError(f"no fixture version {version} in {FIXTURES_DIR}")
+    _mode = "replay"
+    fetch.USE_VALIDATORS = False
+    health.ENABLED = False
+    adapter = ReplayAdapter()
+    fetch.session.mount("https://", adapter)
+    fetch.session.mount("http://", adapter)
+    log(f"[fixtures] Replaying {_dir}")
+    return version
+
+
+def stop():
+    """Back to live traffic."""
+    global _mode, _dir
+    if _save_response in fetch.session.hooks["response"]:
+        fetch.session.hooks["response"].remove(_save_response)
+    fetch.session.mount("https://", fetch._adapter)
+    fetch.session.mount("http://", fetch._adapter)
+    fetch.USE_VALIDATORS = True
+    health.ENABLED = True
+    _mode = None
+    _dir = None
+
+
+def context_options(resort):
+    """Extra new_context() options for a resort's browser context."""
+    if _mode != "record":
+        return {}
+    os.makedirs(_path("har"), exist_ok=True)
+    return {"record_har_path": _path("har", f"{resort}.har"), "record_har_content": "embed"}
+
+
+def attach(context, resort):
+    """Route a replaying context from the resort's HAR (unrecorded requests are aborted)."""
+    if _mode == "replay":
+        context.route_from_har(_path("har", f"{resort}.har"), not_found="abort")
+
+
+def save_page(resort, page):
+    """Keep the page's final HTML and innerText while recording."""
+    if _mode != "record":
+        return
+    try:
+        html = page.content()
+        text = page.evaluate("() => document.body.innerText")
+    except Exception as e:
+        log(f"[fixtures] Could not save {resort} page: {e}")
+        return
+    os.makedirs(_path("html"), exist_ok=True)
+    with open(_path("html", f"{resort}.html"), "w") as f:
+        f.write(html)
+    with open(_path("html", f"{resort}.txt"), "w") as f:
+        f.write(text)
+
+
+def save_results(results):
+    """Finish a recording: store the scrape results and the manifest."""
+    _write_json(_path("results.json"), results)
+    _write_json(_path("manifest.json"), {
+        "format": FORMAT,
+        "recorded_at": datetime.now(MTN_TZ).isoformat(),
+        "resorts": sorted(results),
+    })
+
+
+def load_results():
+    with open(_path("results.json")) as f:
+        return json.load(f)
+
+
+def page_fixture(resort):
+    """(html, innerText) saved for a resort in the active recording, or None."""
+    try:
+        with open(_path("html", f"{resort}.html")) as f:
+            html = f.read()
+        with open(_path("html", f"{resort}.txt")) as f:
+            return html, f.read()
+    except FileNotFoundError:
+        return None
+
+
+def diff_results(expected, actual):
+    """Human-readable differences between two scrape_all() results."""
+    problems = []
+    for resort in sorted(set(expected) | set(actual)):
+        want = expected.get(resort)
+        got = actual.get(resort)
+        if want == got:
+            continue
+        if want is None or got is None:
+            problems.append(f"{resort}: {'missing' if got is None else 'unexpected'}")
+            continue
+        if want["snow_24hr"] != got["snow_24hr"]:
+            problems.append(f"{resort}: snow {want['snow_24hr']} -> {got['snow_24hr']}")
+        want_terrain = {t["name"]: t["status"] for t in want["terrain"]}
+        got_terrain = {t["name"]: t["status"] for t in got["terrain"]}
+        for name in sorted(set(want_terrain) | set(got_terrain)):
+            if want_terrain.get(name) != got_terrain.get(name):
+                problems.append(f"{resort}: {name} {want_terrain.get(name)} -> {got_terrain.get(name)}")
+    return problems
@@ -0,0 +1,108 @@
+"""Per-resort circuit breaker for scrape_all(), persisted in resort_health.
+
+A resort that fails FAILURE_THRESHOLD scrapes in a row (no terrain came
+back) is opened: later runs skip it for BASE_BACKOFF_MIN, doubling with each
+further failure up to MAX_BACKOFF_MIN. Once the backoff has passed the
+breaker is half-open and the next run probes the resort once; success closes
+it, failure opens it again for twice as long. Skipped resorts are left out
+of the scrape results entirely, so nothing is written for them and their
+stored daily_summary rows stay as they were.
+"""
+
+import os
+from datetime import datetime, timedelta
+
+import pytz
+
+from database import get_resort_health, save_resort_health
+
+MTN_TZ = pytz.timezone("America/Denver")
+
+FAILURE_THRESHOLD = int(os.environ.get("SCRAPE_BREAKER_FAILURES", "3"))
+BASE_BACKOFF_MIN = int(os.environ.get("SCRAPE_BREAKER_BACKOFF_MIN", "15"))
+MAX_BACKOFF_MIN = int(os.environ.get("SCRAPE_BREAKER_MAX_BACKOFF_MIN", "240"))
+
+# Off while recording or replaying fixtures, so recordings neither skip resorts nor count failures
+ENABLED = os.environ.get("SCRAPE_BREAKER", "1") != "0"
+
+
+def log(msg):
+    print(msg, flush=True)
+
+
+def _new(resort):
+    return {"resort": resort, "consecutive_failures": 0, "skipped": 0}
+
+
+def state(row, now=None):
+    """"closed", "open" (skip this run) or "half-open" (probe this run)."""
+    if row["consecutive_failures"] < FAILURE_THRESHOLD or not row.get("open_until"):
+        return "closed"
+    now = now or datetime.now(MTN_TZ)
+    return "open" if now < datetime.fromisoformat(row["open_until"]) else "half-open"
+
+
+def backoff(failures):
+    """How long a resort with this many consecutive failures stays open."""
+    return timedelta(minutes=min(MAX_BACKOFF_MIN, BASE_BACKOFF_MIN * 2 ** (failures - FAILURE_THRESHOLD)))
+
+
+def skipped(resorts, now=None):
+    """The resorts this run should skip; logs each skip and half-open probe."""
+    if not ENABLED:
+        return set()
+    now = now or datetime.now(MTN_TZ)
+    rows = get_resort_health()
+    skip = set()
+    for resort in resorts:
+        row = rows.get(resort)
+        if row is None:
+            continue
+        current = state(row, now)
+        if current == "open":
+            skip.add(resort)
+            row["skipped"] += 1
+            save_resort_health(row)
+            log(f"[health] Skipping {resort}: {row['consecutive_failures']} failures in a row "
+                f"({row['last_error']}), retry after {row['open_until'][11:16]}")
+        elif current == "half-open":
+            log(f"[health] Probing {resort} after {row['consecutive_failures']} failures")
+    return skip
+
+
+def record(results, errors, seconds, now=None):
+    """Update each scraped resort's health from its result.
+
+    errors and seconds are {resort: ...} for this run; a resort without
+    terrain counts as failed even when its scraper raised nothing.
+    """
+    if not ENABLED:
+        return
+    now = now or datetime.now(MTN_TZ)
+    stamp = now.isoformat()
+    rows = get_resort_health()
+    for resort, data in results.items():
+        row = rows.get(resort) or _new(resort)
+        row["last_latency_s"] = round(seconds[resort], 3) if resort in seconds else None
+        if data.get("terrain"):
+            if row["consecutive_failures"] >= FAILURE_THRESHOLD:
+                log(f"[health] {resort} recovered after {row['consecutive_failures']} failures")
+            row.update(consecutive_failures=0, last_success_at=stamp, open_until=None)
+        else:
+            failures = row["consecutive_failures"] + 1
+            row.update(consecutive_failures=failures, last_failure_at=stamp,
+                       last_error=errors.get(resort, "no terrain found"))
+            if failures >= FAILURE_THRESHOLD:
+                row["open_until"] = (now + backoff(failures)).isoformat()
+                log(f"[health] {resort} failed {failures} times in a row, "
+                    f"skipping until {row['open_until'][11:16]}")
+        save_resort_health(row)
+
+
+def snapshot(now=None):
+    """Every resort's health row with its current breaker state, for /api/scrape-status."""
+    now = now or datetime.now(MTN_TZ)
+    rows = get_resort_health()
+    for row in rows.values():
+        row["state"] = state(row, now)
+    return rows
@@ -0,0 +1,195 @@
+"""Materialized history pivot behind /api/history.
+
+The pivot has the same shape get_full_history() returns:
+{"dates": [...], "terrain": {"resort|name": {date: ever_opened}}, "snow": {resort: {date: inches}}}.
+It lives in memory and is mirrored to disk as a snapshot plus an append-only
+journal of changed cells, so each scrape costs O(changed cells) and a second
+process (app.py next to scheduler.py) picks up changes by reading the journal
+tail instead of querying SQLite.
+"""
+
+import bisect
+import json
+import os
+import tempfile
+import threading
+
+from database import DB_DIR, get_full_history, get_history_fingerprint
+
+SNAPSHOT_PATH = os.path.join(DB_DIR, "history_pivot.json")
+JOURNAL_PATH = os.path.join(DB_DIR, "history_pivot.journal")
+
+# Fold the journal into a fresh snapshot once it has this many cells
+COMPACT_AFTER = 2000
+
+_lock = threading.Lock()
+_pivot = None
+_snapshot_mtime = None
+_journal_offset = 0
+_journal_cells = 0
+
+
+def _set_cell(pivot, resort, terrain_name, date_str, ever_opened, snowfall_24hr):
+    """Apply one cell; returns True if the pivot changed."""
+    key = f"{resort}|{terrain_name}"
+    days = pivot["terrain"].setdefault(key, {})
+    snow = pivot["snow"].setdefault(resort, {})
+    if days.get(date_str) == ever_opened and snow.get(date_str) == snowfall_24hr:
+        return False
+    dates = pivot["dates"]
+    i = bisect.bisect_left(dates, date_str)
+    if i == len(dates) or dates[i] != date_str:
+        dates.insert(i, date_str)
+    days[date_str] = ever_opened
+    snow[date_str] = snowfall_24hr
+    return True
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _write_snapshot(pivot):
+    global _snapshot_mtime, _journal_offset, _journal_cells
+    os.makedirs(DB_DIR, exist_ok=True)
+    # A unique temp file, so two processes rebuilding at once don't write into each other's
+    fd, tmp = tempfile.mkstemp(prefix="history_pivot.", suffix=".tmp", dir=DB_DIR)
+    with os.fdopen(fd, "w") as f:
+        json.dump(pivot, f, separators=(",", ":"))
+    os.replace(tmp, SNAPSHOT_PATH)
+    # Cells are absolute values, so a reader replaying the old journal on top
+    # of the new snapshot still converges before we truncate it.
+    open(JOURNAL_PATH, "w").close()
+    _snapshot_mtime = _mtime(SNAPSHOT_PATH)
+    _journal_offset = 0
+    _journal_cells = 0
+
+
+def _replay_journal(pivot):
+    global _journal_offset, _journal_cells
+    try:
+        with open(JOURNAL_PATH, "rb") as f:
+            f.seek(_journal_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partial write in progress; pick it up next time
+                _set_cell(pivot, *json.loads(line))
+                _journal_offset += len(line)
+                _journal_cells += 1
+    except FileNotFoundError:
+        pass
+
+
+def _fingerprint(pivot):
+    """Same shape as database.get_history_fingerprint(), computed from the pivot."""
+    cells = opened = snow = 0
+    for key, days in pivot["terrain"].items():
+        resort_snow = pivot["snow"].get(key.split("|", 1)[0], {})
+        cells += len(days)
+        opened += sum(days.values())
+        # Every terrain row of a resort carries that resort's snowfall for the day
+        snow += sum(int((resort_snow.get(d) or 0) * 100) for d in days)
+    return [cells, pivot["dates"][-1] if pivot["dates"] else None, opened, snow]
+
+
+def _load():
+    """Load snapshot + journal from disk, rebuilding from SQLite if missing or stale."""
+    global _pivot, _snapshot_mtime, _journal_offset, _journal_cells
+    _journal_offset = 0
+    _journal_cells = 0
+    try:
+        with open(SNAPSHOT_PATH) as f:
+            saved = json.load(f)
+        _snapshot_mtime = _mtime(SNAPSHOT_PATH)
+        _replay_journal(saved)
+        if _fingerprint(saved) == get_history_fingerprint():
+            _pivot = saved
+            return
+    except (FileNotFoundError, ValueError, KeyError, TypeError):
+        pass
+    rebuild()
+
+
+def rebuild():
+    """Recompute the pivot from daily_summary and persist it."""
+    global _pivot
+    _pivot = get_full_history()
+    _write_snapshot(_pivot)
+    print(f"[history] Rebuilt pivot: {len(_pivot['dates'])} dates, {len(_pivot['terrain'])} terrain", flush=True)
+
+
+def _refresh():
+    """Bring the in-memory pivot up to date with what other processes wrote."""
+    if _pivot is None or _mtime(SNAPSHOT_PATH) != _snapshot_mtime:
+        _load()
+        return
+    try:
+        size = os.stat(JOURNAL_PATH).st_size
+    except FileNotFoundError:
+        size = 0
+    if size < _journal_offset:
+        _load()
+    elif size > _journal_offset:
+        _replay_journal(_pivot)
+
+
+def warm():
+    """Load the pivot at startup so the first /api/history request is served from memory."""
+    with _lock:
+        _refresh()
+
+
+def apply_cells(cells):
+    """Apply (resort, terrain_name, date, ever_opened, snowfall_24hr) cells from an ingest."""
+    global _journal_offset, _journal_cells
+    with _lock:
+        _refresh()
+        changed = [list(cell) for cell in cells if _set_cell(_pivot, *cell)]
+        if not changed:
+            return 0
+        with open(JOURNAL_PATH, "a") as f:
+            f.write("".join(json.dumps(cell, separators=(",", ":")) + "\n" for cell in changed))
+        _journal_offset = os.stat(JOURNAL_PATH).st_size
+        _journal_cells += len(changed)
+        if _journal_cells >= COMPACT_AFTER:
+            _write_snapshot(_pivot)
+        return len(changed)
+
+
+def get_history(start=None, end=None, limit=None):
+    """Return a copy of the pivot that is safe to serialize outside the lock.
+
+    start/end bound the dates (inclusive); limit keeps only the most recent
+    dates in that range. Terrain and resorts with no data in the window are left out.
+    """
+    with _lock:
+        _refresh()
+        if start is None and end is None and limit is None:
+            return {
+                "dates": list(_pivot["dates"]),
+                "terrain": {key: dict(days) for key, days in _pivot["terrain"].items()},
+                "snow": {resort: dict(days) for resort, days in _pivot["snow"].items()},
+            }
+        all_dates = _pivot["dates"]
+        lo = bisect.bisect_left(all_dates, start) if start else 0
+        hi = bisect.bisect_right(all_dates, end) if end else len(all_dates)
+        if limit:
+            lo = max(lo, hi - limit)
+        dates = all_dates[lo:hi]
+        return {
+            "dates": dates,
+            "terrain": _slice(_pivot["terrain"], dates),
+            "snow": _slice(_pivot["snow"], dates),
+        }
+
+
+def _slice(maps, dates):
+    sliced = {}
+    for key, days in maps.items():
+        window = {d: days[d] for d in dates if d in days}
+        if window:
+            sliced[key] = window
+    return sliced
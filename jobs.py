@@ -0,0 +1,237 @@
+"""Scrape and forecast jobs shared by start.py, scheduler.py and the web app."""
+
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import pytz
+
+from database import (
+    ingest_scrape_results, get_avalanche_forecast, get_data_version, save_scrape_run, get_resort_health,
+    create_scrape_job, update_scrape_job, get_scrape_job, scrape_job_cancel_requested, save_scrape_job_resort,
+    close_scrape_job_resorts, claim_scrape_job,
+)
+from avalanche import fetch_avalanche_forecast
+import coordinator
+import history
+import metrics
+import scrape_worker
+import sealed_days
+from response_cache import cache
+from scraper import CONCURRENCY, PW_RESORTS
+
+MTN_TZ = pytz.timezone("America/Denver")
+
+# How often the leader looks for jobs other processes queued for it
+QUEUE_POLL_S = float(os.environ.get("SCRAPE_QUEUE_POLL_S", "1"))
+
+
+def _fetch_avalanche_quietly():
+    try:
+        fetch_avalanche_forecast()
+    except Exception as e:
+        print(f"[scrape] Avalanche fetch error: {e}", flush=True)
+
+
+def new_job(trigger, for_leader=False):
+    """Create a queued scrape job; returns its id for run_scrape(job_id=...) and /api/jobs/<id>.
+
+    With for_leader the job is left for the scheduler leader's serve_queue()
+    to run, so only the leader ever starts browsers.
+    """
+    job_id = uuid.uuid4().hex[:12]
+    create_scrape_job(job_id, trigger, datetime.now(MTN_TZ).isoformat(), for_leader)
+    return job_id
+
+
+def serve_queue():
+    """In the leader, run jobs that other processes queued for it, one at a time."""
+    def run():
+        while True:
+            try:
+                job = claim_scrape_job()
+                if job is None:
+                    time.sleep(QUEUE_POLL_S)
+                    continue
+                print(f"[scrape] Running job {job['id']} queued by another process", flush=True)
+                run_scrape(with_avalanche=True, trigger=job["trigger"], job_id=job["id"])
+            except Exception as e:
+                print(f"[scrape] Job queue error: {e}", flush=True)
+                time.sleep(QUEUE_POLL_S)
+
+    threading.Thread(target=run, name="scrape-queue", daemon=True).start()
+
+
+def run_scrape(with_avalanche=False, trigger="scheduled", fresh_s=coordinator.FRESH_S, job_id=None):
+    """Scrape every resort and ingest the results, one run at a time across processes.
+
+    The call is tracked as a job (created here unless job_id is given). If
+    another run is in flight this waits for it instead, and a run that
+    finished within fresh_s seconds is reused (see coordinator.py); the job
+    then ends as "joined" or "fresh", pointing at the job that did the work,
+    or as "cancelled" if it was cancelled before it started or while waiting.
+    Returns the results of whichever run served the call ({} if it failed).
+    with_avalanche fetches the avalanche forecast in parallel with the
+    browser work instead of after it.
+    """
+    job_id = job_id or new_job(trigger)
+    outcome, run, served_by = coordinator.run(
+        lambda scraped_at: _scrape_and_ingest(scraped_at, with_avalanche, trigger, job_id), trigger, fresh_s, job_id,
+        lambda: scrape_job_cancel_requested(job_id),
+    )
+    if outcome != "ran":
+        update_scrape_job(job_id, status=outcome, joined_job_id=served_by,
+                          error="cancelled before it ran" if outcome == "cancelled" else None,
+                          finished_at=datetime.now(MTN_TZ).isoformat())
+    return run["results"] if run is not None and run["results"] is not None else {}
+
+
+def _scrape_and_ingest(scraped_at, with_avalanche, trigger, job_id):
+    print(f"\n[{scraped_at}] Starting scrape ({trigger}, job {job_id})...", flush=True)
+    update_scrape_job(job_id, status="running", started_at=scraped_at)
+    for resort in ["snowbasin"] + [name for name, _ in PW_RESORTS]:
+        save_scrape_job_resort(job_id, resort, "pending")
+
+    avalanche_thread = None
+    if with_avalanche:
+        avalanche_thread = threading.Thread(target=_fetch_avalanche_quietly, daemon=True)
+        avalanche_thread.start()
+
+    # Each resort is ingested as soon as it finishes, so fast ones show up
+    # without waiting for the slowest page
+    ingested = set()
+    cells = []
+
+    def ingest(resort, data):
+        with metrics.span("scrape_phase_seconds", resort=resort, phase="db_write"):
+            resort_cells = ingest_scrape_results({resort: data}, scraped_at)
+            history.apply_cells(resort_cells)
+        # Record the version either way, so a bump from another writer doesn't flush the whole cache
+        if resort_cells:
+            cache.invalidate_scrape(scraped_at[:10], {resort}, get_data_version())
+        else:
+            cache.note_version(get_data_version())
+        ingested.add(resort)
+        cells.extend(resort_cells)
+
+    def progress(resort, state, result=None, seconds=None, error=None):
+        if state == "done" and scrape_job_cancel_requested(job_id):
+            state = "cancelled"  # finished after the cancel, so not ingested
+        save_scrape_job_resort(
+            job_id, resort, state,
+            started_at=datetime.now(MTN_TZ).isoformat() if state == "running" else None,
+            seconds=round(seconds, 3) if seconds is not None else None, error=error, result=result,
+        )
+        if state == "done":
+            try:
+                ingest(resort, result)
+            except Exception as e:
+                save_scrape_job_resort(
+                    job_id, resort, "failed", seconds=round(seconds, 3) if seconds is not None else None,
+                    error=f"ingest failed: {type(e).__name__}: {e}",
+                )
+                raise
+
+    metrics.start_run()
+    try:
+        results = scrape_worker.scrape(progress, lambda: scrape_job_cancel_requested(job_id))
+        if scrape_job_cancel_requested(job_id):
+            # The worker's reply beat the cancel check; end it like a cancel mid-run
+            raise scrape_worker.Cancelled("scrape cancelled")
+        for resort, data in results.items():
+            for t in data.get("terrain", []):
+                print(f"  {resort} | {t['name']} | {t['status']}")
+            if resort not in ingested and data.get("terrain"):
+                ingest(resort, data)
+    except Exception as e:
+        # A failed ingest (e.g. a locked database) ends the job too, so it is never left "running"
+        metrics.finish_run()
+        cancelled = isinstance(e, scrape_worker.Cancelled)
+        error = str(e) if isinstance(e, scrape_worker.WorkerError) else f"{type(e).__name__}: {e}"
+        what = "Cancelled" if cancelled else "Scrape worker failed" if isinstance(e, scrape_worker.WorkerError) \
+            else "Scrape failed"
+        print(f"[scrape] {what}, kept {len(ingested)} finished resort(s): {error}", flush=True)
+        update_scrape_job(job_id, status="cancelled" if cancelled else "failed", error=error,
+                          finished_at=datetime.now(MTN_TZ).isoformat(), cells_changed=len(cells))
+        close_scrape_job_resorts(job_id, "cancelled" if cancelled else "failed")
+        if avalanche_thread is not None:
+            avalanche_thread.join()
+        return {}
+
+    if not ingested:
+        cache.note_version(get_data_version())
+
+    duration, timings = metrics.finish_run()
+    finished_at = datetime.now(MTN_TZ).isoformat()
+    failed = sum(1 for data in results.values() if not data.get("terrain"))
+    try:
+        save_scrape_run(scraped_at, round(duration, 3), len(results), failed, len(cells), timings,
+                        finished_at=finished_at, trigger=trigger, results=results, job_id=job_id)
+    except Exception as e:
+        print(f"[scrape] Could not record the run: {e}", flush=True)
+    update_scrape_job(job_id, status="done", finished_at=finished_at, cells_changed=len(cells))
+
+    if avalanche_thread is not None:
+        avalanche_thread.join()
+    print(f"[{scraped_at}] Scrape complete.\n", flush=True)
+    return results
+
+
+def get_job(job_id):
+    """A job with per-resort progress and a rough eta_s from each resort's last scrape time, or None."""
+    job = get_scrape_job(job_id)
+    if job is None:
+        return None
+    job["eta_s"] = None
+    if job["status"] != "running":
+        return job
+    expected = {resort: row["last_latency_s"] for resort, row in get_resort_health().items()}
+    now = datetime.now(MTN_TZ)
+    running = []
+    pending = 0.0
+    known = False
+    for resort, entry in job["resorts"].items():
+        if entry["state"] not in ("running", "pending"):
+            continue
+        guess = expected.get(resort) or 0.0
+        known = known or resort in expected
+        if entry["state"] == "running" and entry["started_at"]:
+            elapsed = (now - datetime.fromisoformat(entry["started_at"])).total_seconds()
+            entry["elapsed_s"] = round(elapsed, 1)
+            running.append(max(0.0, guess - elapsed))
+        else:
+            pending += guess
+    if known:
+        # Running resorts finish in parallel; pending ones share the browser workers
+        job["eta_s"] = round(max(running, default=0.0) + pending / CONCURRENCY, 1)
+    return job
+
+
+def run_avalanche():
+    """Fetch UAC avalanche forecast (skip if already have today's with image AND correct date)."""
+    today = datetime.now(MTN_TZ).strftime("%Y-%m-%d")
+    existing = get_avalanche_forecast("salt-lake", today)
+    if existing:
+        try:
+            fj = json.loads(existing.get("forecast_json", "{}"))
+            issued_date = fj.get("issued_date", "")
+            if fj.get("danger_rose_image") and issued_date == today:
+                print(f"[avalanche] Today's forecast (issued {issued_date}) with rose image exists, skipping")
+                return
+        except Exception:
+            pass
+    try:
+        fetch_avalanche_forecast()
+    except Exception as e:
+        print(f"[avalanche] Scheduler error: {e}")
+
+
+def run_seal():
+    """Seal today (after the last scrape) and any finished day missing a seal."""
+    try:
+        sealed_days.seal_finished_days(include_today=True)
+    except Exception as e:
+        print(f"[seal] Error: {e}", flush=True)
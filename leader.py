@@ -0,0 +1,92 @@
+"""File-lock leader election between serving processes.
+
+Every process that could run the scheduler campaigns for an exclusive
+flock on LOCK_PATH; the holder is the leader and runs the scheduled scrapes.
+The kernel drops the lock when the leader exits or is killed, and a
+campaigning process picks it up within POLL_S. The leader's pid is written
+into the lock file for /api/scrape-status.
+"""
+
+import fcntl
+import os
+import threading
+import time
+
+from database import DB_DIR
+
+LOCK_PATH = os.path.join(DB_DIR, "scheduler.lock")
+POLL_S = float(os.environ.get("LEADER_POLL_S", "5"))
+
+_lock_file = None
+
+
+def log(msg):
+    print(msg, flush=True)
+
+
+def _try_acquire():
+    global _lock_file
+    os.makedirs(DB_DIR, exist_ok=True)
+    f = open(LOCK_PATH, "a+")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        f.close()
+        return False
+    f.seek(0)
+    f.truncate()
+    f.write(str(os.getpid()))
+    f.flush()
+    _lock_file = f  # held open for the life of the process
+    return True
+
+
+def acquire(block=True):
+    """Become the leader; with block=False returns False at once if another process is."""
+    if _lock_file is not None:
+        return True
+    while not _try_acquire():
+        if not block:
+            return False
+        time.sleep(POLL_S)
+    log(f"[leader] pid {os.getpid()} is the leader")
+    return True
+
+
+def campaign(on_elected):
+    """In the background, wait for leadership and then call on_elected() once."""
+    def run():
+        acquire()
+        on_elected()
+
+    threading.Thread(target=run, name="leader-election", daemon=True).start()
+
+
+def is_leader():
+    return _lock_file is not None
+
+
+def held():
+    """True while some process (this one included) is the leader."""
+    if _lock_file is not None:
+        return True
+    try:
+        f = open(LOCK_PATH)
+    except FileNotFoundError:
+        return False
+    with f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(f, fcntl.LOCK_UN)
+    return False
+
+
+def status():
+    try:
+        with open(LOCK_PATH) as f:
+            leader_pid = int(f.read().strip() or 0) or None
+    except (FileNotFoundError, ValueError):
+        leader_pid = None
+    return {"pid": os.getpid(), "is_leader": is_leader(), "leader_pid": leader_pid}
@@ -0,0 +1,334 @@
+"""In-process timing spans, counters and gauges, rendered in the Prometheus text format.
+
+span() times a block into a histogram; scrapers label theirs by resort and
+phase (goto, wait, evaluate, fetch, parse, db_write). While a scrape run is
+open (start_run() .. finish_run()) phase times are also summed per
+resort.phase, and jobs.py stores that summary in the scrape_runs table so
+timings can be compared across runs and processes. A scrape worker
+subprocess hands its numbers to the web process with export() / absorb().
+
+Serving processes (every gunicorn worker, scheduler.py) call share(): each
+one rewrites its own file under SHARED_DIR every FLUSH_S, and render() in
+any of them adds up every process's histograms and counters, so
+/api/metrics reports the same totals whichever worker answers it. Files of
+processes that have exited are folded into a retired file, which keeps
+counters from going backwards. Gauges are taken from live processes only;
+process-local ones carry a pid label.
+"""
+
+import atexit
+import bisect
+import fcntl
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from database import DB_DIR
+
+# Seconds; covers a fast route (ms) up to a slow Chromium navigation (a minute)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    "scrape_phase_seconds": ("histogram", "Time spent in each scraper phase, by resort."),
+    "scrape_resort_seconds": ("histogram", "Wall time to scrape one resort."),
+    "scrape_run_seconds": ("histogram", "Wall time of a whole scrape run, scrape to ingest."),
+    "http_request_duration_seconds": ("histogram", "Flask route latency (until the response is returned)."),
+    "scrape_wait_timeouts_total": ("counter", "Readiness waits that hit their ceiling."),
+    "scrape_errors_total": ("counter", "Resorts that came back without terrain."),
+    "http_fetch_total": ("counter", "Plain-HTTP fetches by validator outcome."),
+}
+
+SHARED_DIR = os.path.join(DB_DIR, "metrics")
+RETIRED_PATH = os.path.join(SHARED_DIR, "retired.json")
+FLUSH_S = float(os.environ.get("METRICS_FLUSH_S", "15"))
+
+_lock = threading.Lock()
+_histograms = {}  # (name, labels) -> [bucket counts (last is +Inf), sum, count]
+_counters = {}    # (name, labels) -> value
+_gauges = {}      # (name, labels) -> value, replaced wholesale by set_gauges()
+_gauge_help = {}
+_collectors = []
+_run = None
+_shared_path = None  # this process's file under SHARED_DIR, once share() was called
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def observe(name, seconds, **labels):
+    key = _key(name, labels)
+    with _lock:
+        entry = _histograms.get(key)
+        if entry is None:
+            entry = _histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+        entry[0][bisect.bisect_left(BUCKETS, seconds)] += 1
+        entry[1] += seconds
+        entry[2] += 1
+        if _run is not None and name == "scrape_phase_seconds":
+            phase = f"{labels.get('resort')}.{labels.get('phase')}"
+            _run["timings"][phase] = _run["timings"].get(phase, 0.0) + seconds
+
+
+def inc(name, amount=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+@contextmanager
+def span(name, **labels):
+    """Time the enclosed block into histogram `name`, even if it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def set_gauges(name, help_text, values, metric_type="gauge"):
+    """Replace all samples of a gauge: values is [(labels dict, value)]."""
+    with _lock:
+        for key in [k for k in _gauges if k[0] == name]:
+            del _gauges[key]
+        for labels, value in values:
+            _gauges[_key(name, labels)] = value
+        _gauge_help[name] = (metric_type, help_text)
+
+
+def start_run():
+    """Start summing phase timings for a scrape run."""
+    global _run
+    with _lock:
+        _run = {"started": time.monotonic(), "timings": {}}
+
+
+def finish_run():
+    """Close the open run; returns (duration seconds, {resort.phase: seconds})."""
+    global _run
+    with _lock:
+        run, _run = _run, None
+    if run is None:
+        return 0.0, {}
+    duration = time.monotonic() - run["started"]
+    observe("scrape_run_seconds", duration)
+    return duration, {k: round(v, 3) for k, v in sorted(run["timings"].items())}
+
+
+def export():
+    """Take this process's histograms and counters, resetting them (for a worker to hand to its parent)."""
+    global _histograms, _counters
+    with _lock:
+        state = {"histograms": _histograms, "counters": _counters}
+        _histograms, _counters = {}, {}
+    return state
+
+
+def absorb(state):
+    """Add another process's export() into this one, including the open run's phase timings."""
+    with _lock:
+        for key, (counts, total, count) in state["histograms"].items():
+            entry = _histograms.get(key)
+            if entry is None:
+                entry = _histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+            entry[0] = [a + b for a, b in zip(entry[0], counts)]
+            entry[1] += total
+            entry[2] += count
+            name, labels = key
+            if _run is not None and name == "scrape_phase_seconds":
+                labels = dict(labels)
+                phase = f"{labels.get('resort')}.{labels.get('phase')}"
+                _run["timings"][phase] = _run["timings"].get(phase, 0.0) + total
+        for key, value in state["counters"].items():
+            _counters[key] = _counters.get(key, 0) + value
+
+
+def collector(fn):
+    """Register fn() to refresh gauges before each render() and flush (usable as a decorator)."""
+    _collectors.append(fn)
+    return fn
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _dump():
+    with _lock:
+        return {
+            "histograms": [[name, labels, counts, total, count]
+                           for (name, labels), (counts, total, count) in _histograms.items()],
+            "counters": [[name, labels, value] for (name, labels), value in _counters.items()],
+            "gauges": [[name, labels, value, *_gauge_help[name]] for (name, labels), value in _gauges.items()],
+        }
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write(path, state):
+    fd, tmp = tempfile.mkstemp(prefix=".metrics.", suffix=".tmp", dir=SHARED_DIR)
+    with os.fdopen(fd, "w") as f:
+        json.dump(state, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def _add(histograms, counters, state):
+    """Sum a dumped state's histograms and counters into the given dicts."""
+    for name, labels, counts, total, count in state["histograms"]:
+        key = name, tuple(map(tuple, labels))
+        entry = histograms.get(key)
+        if entry is None:
+            entry = histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+        entry[0] = [a + b for a, b in zip(entry[0], counts)]
+        entry[1] += total
+        entry[2] += count
+    for name, labels, value in state["counters"]:
+        key = name, tuple(map(tuple, labels))
+        counters[key] = counters.get(key, 0) + value
+
+
+def share():
+    """Publish this process's metrics under SHARED_DIR (every FLUSH_S and at exit) for render() to add up."""
+    global _shared_path
+    if _shared_path is not None:
+        return
+    os.makedirs(SHARED_DIR, exist_ok=True)
+    _shared_path = os.path.join(SHARED_DIR, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.json")
+
+    def loop():
+        while True:
+            time.sleep(FLUSH_S)
+            try:
+                flush()
+            except OSError as e:
+                print(f"[metrics] Could not write {_shared_path}: {e}", flush=True)
+
+    threading.Thread(target=loop, name="metrics-flush", daemon=True).start()
+    atexit.register(flush)
+
+
+def clear_shared():
+    """Forget every process's shared metrics; call once at server startup, before share()."""
+    for path in glob.glob(os.path.join(SHARED_DIR, "*.json")):
+        os.remove(path)
+
+
+def flush():
+    """Rewrite this process's shared file with everything it has recorded so far."""
+    if _shared_path is None:
+        return
+    for fn in _collectors:
+        fn()
+    _write(_shared_path, _dump())
+
+
+def _retire(path, state):
+    """Fold an exited process's histograms and counters into the retired file (under the lock)."""
+    histograms, counters = {}, {}
+    retired = _read(RETIRED_PATH)
+    if retired is not None:
+        _add(histograms, counters, retired)
+    _add(histograms, counters, state)
+    _write(RETIRED_PATH, {
+        "histograms": [[name, labels, *entry] for (name, labels), entry in histograms.items()],
+        "counters": [[name, labels, value] for (name, labels), value in counters.items()],
+        "gauges": [],
+    })
+    os.remove(path)
+
+
+def _collect_shared():
+    """(histograms, counters, gauges, gauge help) summed over every process sharing metrics."""
+    flush()
+    histograms, counters, gauges, gauge_help = {}, {}, {}, {}
+    with open(os.path.join(SHARED_DIR, ".lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)  # retiring a file must not race another render()
+        for path in glob.glob(os.path.join(SHARED_DIR, "*-*.json")):
+            state = _read(path)
+            if state is not None and not _pid_alive(int(os.path.basename(path).split("-", 1)[0])):
+                _retire(path, state)
+        for path in sorted(glob.glob(os.path.join(SHARED_DIR, "*.json"))):
+            state = _read(path)
+            if state is None:
+                continue
+            _add(histograms, counters, state)
+            if path != _shared_path:
+                for name, labels, value, metric_type, help_text in state["gauges"]:
+                    gauges[name, tuple(map(tuple, labels))] = value
+                    gauge_help[name] = (metric_type, help_text)
+    # This process's gauges were just refreshed, so they win over another process's copy
+    with _lock:
+        gauges.update(_gauges)
+        gauge_help.update(_gauge_help)
+    return histograms, counters, gauges, gauge_help
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """Everything recorded so far, in the Prometheus text exposition format.
+
+    After share() this covers every sharing process; otherwise just this one.
+    """
+    if _shared_path is not None:
+        histograms, counters, gauges, gauge_help = _collect_shared()
+    else:
+        for fn in _collectors:
+            fn()
+        with _lock:
+            histograms = {k: (list(v[0]), v[1], v[2]) for k, v in _histograms.items()}
+            counters = dict(_counters)
+            gauges = dict(_gauges)
+            gauge_help = dict(_gauge_help)
+
+    lines = []
+    described = set()
+
+    def describe(name, metric_type, help_text):
+        if name not in described:
+            described.add(name)
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+    for (name, labels), (counts, total, count) in sorted(histograms.items()):
+        describe(name, *HELP.get(name, ("histogram", name)))
+        cumulative = 0
+        for bound, n in zip(BUCKETS + ("+Inf",), counts):
+            cumulative += n
+            lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {_format(total)}")
+        lines.append(f"{name}_count{_labels(labels)} {count}")
+    for (name, labels), value in sorted(counters.items()):
+        describe(name, *HELP.get(name, ("counter", name)))
+        lines.append(f"{name}{_labels(labels)} {_format(value)}")
+    for (name, labels), value in sorted(gauges.items()):
+        describe(name, *gauge_help[name])
+        lines.append(f"{name}{_labels(labels)} {_format(value)}")
+    return "\n".join(lines) + "\n"
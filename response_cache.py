@@ -0,0 +1,120 @@
+"""Bounded in-process cache of serialized API responses.
+
+Entries are keyed by endpoint + query args and tagged with the date and
+resort they were computed from, so the ingest path can drop exactly the
+responses a scrape or forecast changed. If the data version moves without an
+invalidation from this process (e.g. scheduler.py writing from another
+process), the whole cache is flushed instead.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_BYTES", str(16 * 1024 * 1024)))
+# Bigger bodies are still served, just never cached
+MAX_ENTRY_BYTES = MAX_BYTES // 8
+
+# Responses that depend on every daily_summary row
+GLOBAL_KINDS = ("history", "dates")
+
+
+class ResponseCache:
+    def __init__(self, max_bytes=MAX_BYTES, max_entry_bytes=MAX_ENTRY_BYTES):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries = OrderedDict()  # key -> (body, mimetype, kind, date, resort)
+        self._lock = threading.Lock()
+        self._size = 0
+        self._version = None
+        # Bumped by every invalidation; a fill that started before one is dropped
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidated = 0
+
+    def get(self, key, data_version):
+        """Return (body, mimetype), or None on a miss."""
+        with self._lock:
+            if data_version != self._version:
+                if self._version is not None:
+                    self._clear()
+                self._version = data_version
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key, body, mimetype, kind, date=None, resort=None, generation=None):
+        if len(body) > self.max_entry_bytes:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[0])
+            self._entries[key] = (body, mimetype, kind, date, resort)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted[0])
+                self.evictions += 1
+
+    def _drop(self, match):
+        for key in [k for k, entry in self._entries.items() if match(*entry[2:])]:
+            self._size -= len(self._entries.pop(key)[0])
+            self.invalidated += 1
+        self.generation += 1
+
+    def _clear(self):
+        self.invalidated += len(self._entries)
+        self._entries.clear()
+        self._size = 0
+        self.generation += 1
+
+    def invalidate_scrape(self, date_str, resorts, data_version):
+        """Drop responses affected by new daily_summary cells for date_str.
+
+        Status views for date_str and later dates change (closed streaks look
+        back), as do the calendars of the touched resorts and the global lists.
+        """
+        resorts = set(resorts)
+        with self._lock:
+            self._drop(lambda kind, date, resort: (
+                kind in GLOBAL_KINDS
+                or (kind == "status" and date >= date_str)
+                or (resort is not None and resort in resorts)
+            ))
+            self._version = data_version
+
+    def invalidate_avalanche(self, date_str, data_version):
+        with self._lock:
+            self._drop(lambda kind, date, resort: kind == "avalanche" and date == date_str)
+            self._version = data_version
+
+    def note_version(self, data_version):
+        """Record a write that changed no cached response (e.g. an unchanged scrape)."""
+        with self._lock:
+            self._version = data_version
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidated": self.invalidated,
+            }
+
+
+cache = ResponseCache()
@@ -0,0 +1,252 @@
+"""Supervised scrape worker subprocess.
+
+With SCRAPE_WORKER=process (the default) scrape_all(), its warm Chromium
+workers and all HTML parsing run in a child process, so parsing never
+competes with Flask for the GIL and a Chromium memory spike can only take
+the worker down. The parent sends a job over a pipe, gets the results (plus
+the worker's metrics and browser stats) back, and does the DB ingest itself.
+
+The supervisor kills the worker's whole process group and starts a fresh
+one when it exits, exceeds WORKER_MAX_RSS_MB (worker plus Chromium, sampled
+while a job runs and before each one) or takes longer than
+WORKER_TIMEOUT_S on a job. The worker also volunteers itself to the kernel's
+OOM killer ahead of the web server. SCRAPE_WORKER=inline keeps the old
+single-process behaviour.
+"""
+
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+import browser_service
+import metrics
+import scraper
+from browser_service import tree_rss_mb
+
+MODE = os.environ.get("SCRAPE_WORKER", "process")
+WORKER_MAX_RSS_MB = int(os.environ.get("SCRAPE_WORKER_MAX_RSS_MB", "1400"))
+WORKER_TIMEOUT_S = int(os.environ.get("SCRAPE_WORKER_TIMEOUT_S", "600"))
+POLL_S = 1.0
+
+
+class WorkerError(Exception):
+    pass
+
+
+class Cancelled(WorkerError):
+    pass
+
+
+def log(msg):
+    print(msg, flush=True)
+
+
+def _serve(conn, warm):
+    """Worker process: run scrape jobs from the pipe until told to stop."""
+    os.setsid()  # own process group, so the supervisor can kill Chromium with it
+    try:
+        with open("/proc/self/oom_score_adj", "w") as f:
+            f.write("500")
+    except OSError:
+        pass
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C is the parent's to handle
+    if warm:
+        browser_service.start(scraper.CONCURRENCY, scraper.CHROMIUM_ARGS)
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+
+        def progress(*event):
+            conn.send(("progress", event))
+
+        try:
+            results = scraper.scrape_all(progress=progress)
+            conn.send(("done", results, metrics.export(), browser_service.stats()))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}", metrics.export(), browser_service.stats()))
+    browser_service.stop()
+
+
+class Supervisor:
+    def __init__(self, warm):
+        self.warm = warm
+        self.process = None
+        self.conn = None
+        self.lock = threading.Lock()
+        self.started_at = None
+        self.jobs = 0
+        self.restarts = 0
+        self.last_restart_reason = None
+        self.browsers = []
+
+    def _spawn(self):
+        ctx = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_serve, args=(child_conn, self.warm), name="scrape-worker", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.started_at = time.time()
+        self.browsers = []
+        log(f"[worker] Started scrape worker pid {self.process.pid}")
+
+    def _kill(self, reason):
+        """Kill the worker and everything it launched; the next job spawns a fresh one."""
+        log(f"[worker] Killing scrape worker pid {self.process.pid}: {reason}")
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except OSError:
+            self.process.kill()
+        self.process.join(10)
+        self.conn.close()
+        self.process = None
+        self.restarts += 1
+        self.last_restart_reason = reason
+
+    def rss_mb(self):
+        if self.process is None:
+            return None
+        return tree_rss_mb(self.process.pid)
+
+    def scrape(self, progress=None, cancelled=None):
+        """Run scrape_all() in the worker; raises WorkerError if it dies, hangs or outgrows its limit.
+
+        Progress events from the worker are passed to progress(); cancelled()
+        is polled while waiting, and a True kills the worker (raising Cancelled).
+        """
+        with self.lock:
+            if self.process is not None and not self.process.is_alive():
+                self._kill(f"exited with code {self.process.exitcode}")
+            idle_rss = self.rss_mb() or 0
+            if idle_rss > WORKER_MAX_RSS_MB:
+                self._kill(f"idle at {idle_rss:.0f} MB")
+            if self.process is None:
+                self._spawn()
+
+            self.jobs += 1
+            try:
+                self.conn.send("scrape")
+            except OSError as e:
+                self._kill(f"pipe closed ({e})")
+                raise WorkerError("scrape worker was not reachable")
+            deadline = time.monotonic() + WORKER_TIMEOUT_S
+            while True:
+                try:
+                    if self.conn.poll(POLL_S):
+                        reply = self.conn.recv()
+                        if reply[0] != "progress":
+                            break
+                        if progress is not None:
+                            progress(*reply[1])
+                except (EOFError, OSError):
+                    self._kill(f"died during a scrape (exit code {self.process.exitcode})")
+                    raise WorkerError("scrape worker died during the scrape")
+                except Exception as e:
+                    # The pipe still holds this job's events; the next job must start on a fresh one
+                    self._kill(f"progress handler failed ({type(e).__name__}: {e})")
+                    raise
+                if cancelled is not None and cancelled():
+                    self._kill("scrape cancelled")
+                    raise Cancelled("scrape cancelled")
+                rss = self.rss_mb() or 0
+                if rss > WORKER_MAX_RSS_MB:
+                    self._kill(f"{rss:.0f} MB is over the {WORKER_MAX_RSS_MB} MB limit")
+                    raise WorkerError("scrape worker exceeded its memory limit")
+                if time.monotonic() > deadline:
+                    self._kill(f"no result after {WORKER_TIMEOUT_S}s")
+                    raise WorkerError("scrape worker timed out")
+
+        status, payload, worker_metrics, self.browsers = reply
+        metrics.absorb(worker_metrics)
+        if status == "error":
+            raise WorkerError(payload)
+        return payload
+
+    def stop(self, timeout=30):
+        with self.lock:
+            if self.process is None:
+                return
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self._kill("did not stop")
+
+    def stats(self):
+        # Read without the lock (a scrape holds it for minutes), so take one
+        # reference: _kill() may set self.process to None at any moment
+        process = self.process
+        alive = process is not None and process.is_alive()
+        return {
+            "pid": process.pid if alive else None,
+            "rss_mb": tree_rss_mb(process.pid) if alive else None,
+            "uptime_s": round(time.time() - self.started_at) if alive else None,
+            "jobs": self.jobs,
+            "restarts": self.restarts,
+            "last_restart_reason": self.last_restart_reason,
+        }
+
+
+_supervisor = None
+
+
+def start():
+    """Start scraping infrastructure for a long-running process: the worker, or warm browsers inline."""
+    global _supervisor
+    warm = scraper.SCRAPE_MODE != "sequential"
+    if MODE != "process":
+        if warm:
+            browser_service.start(scraper.CONCURRENCY, scraper.CHROMIUM_ARGS)
+        return
+    if _supervisor is None:
+        _supervisor = Supervisor(warm)
+        with _supervisor.lock:
+            _supervisor._spawn()
+
+
+def stop():
+    if _supervisor is not None:
+        _supervisor.stop()
+    browser_service.stop()
+
+
+def scrape(progress=None, cancelled=None):
+    """scrape_all() in the worker when one was started.
+
+    Otherwise (a one-off script, or a web process when no scheduler leader
+    is running) it runs in a short-lived cold worker, or in this
+    process with SCRAPE_WORKER=inline, where cancelled() is only checked
+    once the scrape is over.
+    """
+    if _supervisor is not None:
+        return _supervisor.scrape(progress, cancelled)
+    if MODE != "process":
+        results = scraper.scrape_all(progress=progress)
+        if cancelled is not None and cancelled():
+            raise Cancelled("scrape cancelled")
+        return results
+    one_shot = Supervisor(warm=False)
+    try:
+        return one_shot.scrape(progress, cancelled)
+    finally:
+        one_shot.stop()
+
+
+def stats():
+    """The worker's state, or None when scraping runs inline."""
+    return _supervisor.stats() if _supervisor is not None else None
+
+
+def browser_stats():
+    """Warm browser stats from wherever the browsers live (the worker reports them after each job)."""
+    if _supervisor is not None:
+        return _supervisor.browsers
+    return browser_service.stats()
@@ -1,8 +1,21 @@
+import importlib.util
 import re
 import json
+import os
+import queue
 import sys
-import requests
-from bs4 import BeautifulSoup
+import threading
+import time
+from urllib.parse import urlsplit
+
+from bs4 import BeautifulSoup, CData, NavigableString, Tag
+
+import browser_service
+import feeds
+import fixtures
+import health
+import metrics
+from fetch import conditional_get
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
@@ -29,6 +42,47 @@ TRACKED = {
 }
 
 
+# Request routing: nothing we read needs pictures, video, fonts or third-party
+# widgets. Stylesheets stay, since innerText depends on what CSS hides.
+BLOCK_ASSETS = os.environ.get("SCRAPE_BLOCK_ASSETS", "1") != "0"
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+BLOCKED_DOMAINS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "googlesyndication.com",
+    "facebook.net", "facebook.com", "connect.facebook.net", "hotjar.com", "clarity.ms",
+    "intercom.io", "intercomcdn.com", "livechatinc.com", "zdassets.com", "zendesk.com",
+    "drift.com", "youtube.com", "ytimg.com", "vimeo.com", "vimeocdn.com",
+    "newrelic.com", "nr-data.net", "segment.io", "segment.com", "tiktok.com",
+    "pinterest.com", "bing.com", "adnxs.com", "criteo.com", "quantserve.com",
+)
+# (resource type, URL regex) pairs a resort still loads despite the rules above.
+# Brighton and Powder Mountain read status off <img> tags, so their status
+# icons (small SVGs, first-party images) must resolve.
+ROUTE_ALLOW = {
+    "brighton": [("image", r"\.svg(?:\?|$)|brightonresort\.com/")],
+    "powdermountain": [("image", r"\.svg(?:\?|$)|powdermountain\.com/")],
+}
+
+# Pages each Playwright scraper loads, for feed capture (python scraper.py --capture)
+RESORT_PAGES = {
+    "snowbird": [
+        "https://www.snowbird.com/the-mountain/mountain-report/lift-trail-report/",
+        "https://www.snowbird.com/the-mountain/mountain-report/current-conditions-weather/",
+    ],
+    "brighton": ["https://www.brightonresort.com/conditions"],
+    "solitude": ["https://www.solitudemountain.com/mountain-and-village/conditions-and-maps"],
+    "powdermountain": ["https://powdermountain.com/conditions"],
+}
+
+# Try a resort's captured JSON feed before rendering its page ("0" to always render)
+USE_FEEDS = os.environ.get("SCRAPE_FEEDS", "1") != "0"
+
+# Per-resort routing counters from the most recent scrape
+route_stats = {}
+# The most recent scrape's errors and wall time per resort (fed to health.record)
+scrape_errors = {}
+scrape_seconds = {}
+
+
 def log(msg):
     print(msg, flush=True)
 
@@ -42,6 +96,201 @@ def normalize_status(raw):
     return "closed"
 
 
+# --- Extraction engine -------------------------------------------------------
+
+# "lxml" is faster on big pages when installed; html.parser is the default
+# because the scrapers were tuned against its tree.
+HTML_PARSER = os.environ.get("SCRAPE_HTML_PARSER", "html.parser")
+if HTML_PARSER == "lxml" and importlib.util.find_spec("lxml") is None:
+    HTML_PARSER = "html.parser"
+
+# Strings get_text() counts for ordinary tags (no comments, scripts, styles)
+_TEXT_TYPES = (NavigableString, CData)
+
+OPEN_WORD_RE = re.compile(r"\bopen\b", re.IGNORECASE)
+PENDING_WORD_RE = re.compile(r"\bpending\b", re.IGNORECASE)
+LIFT_OPEN_RE = re.compile(r"(?:Lift|Trail)\s+Open", re.IGNORECASE)
+LIFT_PENDING_RE = re.compile(r"(?:Lift|Trail)\s+Pending", re.IGNORECASE)
+
+# 24h snow, tried in order per page; the first match wins
+SNOW_24H_RE = re.compile(r"24[\s\-]*(?:Hour|Hr|Hrs?)[\s\-]*(?:Snow(?:fall)?)?[:\s]*([\d.]+)", re.IGNORECASE)
+NEW_SNOW_RE = re.compile(r"(?:New|Fresh)\s+Snow[:\s]*([\d.]+)", re.IGNORECASE)
+SNOW_PATTERNS = {
+    "snowbird": (
+        re.compile(r"24[\s\-]*(?:Hour|Hr)[\s\-]*Snow\s*([\d.]+)", re.IGNORECASE),
+        re.compile(r"([\d.]+)\s*[\"″]\s*24"),
+    ),
+    "brighton": (
+        re.compile(r"([\d.]+)[\"″\s]*Snow\s*24\s*Hrs", re.IGNORECASE),
+        re.compile(r"Snow\s*24\s*Hrs[.\s]*([\d.]+)", re.IGNORECASE),
+    ),
+    "snowbasin": (SNOW_24H_RE, NEW_SNOW_RE),
+    "solitude": (
+        SNOW_24H_RE,
+        NEW_SNOW_RE,
+        re.compile(r"([\d.]+)[\"″\s]*(?:in)?\s*(?:new|last|24)", re.IGNORECASE),
+    ),
+    "powdermountain": (
+        re.compile(r"24[\s\-]*(?:Hours?|Hrs?)[\s\-]*(?:Snow(?:fall)?)?[:\s]*([\d.]+)", re.IGNORECASE),
+        re.compile(r"([\d.]+)[\"″\s]*(?:in)?\s*(?:new|overnight|24)", re.IGNORECASE),
+        NEW_SNOW_RE,
+    ),
+}
+
+
+def snow_from_text(resort, text):
+    """The first 24h snow figure SNOW_PATTERNS[resort] finds in text, else 0.0."""
+    for pattern in SNOW_PATTERNS[resort]:
+        m = pattern.search(text)
+        if m:
+            return float(m.group(1))
+    return 0.0
+
+
+class NameMatcher:
+    """Finds which of a resort's tracked names occur in a text with one regex pass.
+
+    The lookahead alternation tests every position, longest name first; names
+    contained in a matched name (e.g. a prefix) are added afterwards, so a
+    shorter name hidden by a longer match at the same position is still found.
+    """
+
+    def __init__(self, names):
+        self.names = {name.lower(): name for name in names}
+        keys = sorted(self.names, key=len, reverse=True)
+        self._re = re.compile("(?=(" + "|".join(re.escape(k) for k in keys) + "))")
+        self._contained = {k: [other for other in keys if other != k and other in k] for k in keys}
+
+    def find(self, text_lower):
+        """Lowercase keys of the tracked names that occur in text_lower."""
+        found = set()
+        for m in self._re.finditer(text_lower):
+            key = m.group(1)
+            if key not in found:
+                found.add(key)
+                found.update(self._contained[key])
+        return found
+
+
+MATCHERS = {resort: NameMatcher(names) for resort, names in TRACKED.items()}
+
+
+def parse_html(html):
+    return BeautifulSoup(html, HTML_PARSER)
+
+
+def walk(soup, cell_tags=("td",), element_tags=(), max_len=300):
+    """Collect row and element texts from a parsed page in one pass over the tree.
+
+    Returns (rows, elements):
+      rows: for every <tr> with at least two cell_tags descendants, the cells'
+            get_text(strip=True) joined by spaces, in document order;
+      elements: get_text(strip=True) of every element_tags element whose text
+            is shorter than max_len.
+    Equivalent to calling find_all()/get_text() per tag, but each string is
+    visited once and long elements are never joined.
+    """
+    strings = []    # stripped, non-empty strings in document order
+    lengths = [0]   # lengths[i] = total length of strings[:i]
+    rows = []       # per <tr>: list of cell spans, or the joined text once closed
+    open_rows = []  # indexes into rows of the <tr>s enclosing the current node
+    elements = []
+    stack = [(soup, 0, iter(soup.contents), None, None)]
+    while stack:
+        tag, start, children, cell_span, row_index = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            end = len(strings)
+            if cell_span is not None:
+                cell_span[1] = end
+            if row_index is not None:
+                open_rows.pop()
+                cells = rows[row_index]
+                rows[row_index] = (
+                    " ".join("".join(strings[a:b]) for a, b in cells) if len(cells) >= 2 else None
+                )
+            if tag.name in element_tags and lengths[end] - lengths[start] < max_len:
+                elements.append("".join(strings[start:end]))
+            continue
+        if isinstance(child, Tag):
+            cell_span = row_index = None
+            if child.name in cell_tags and open_rows:
+                cell_span = [len(strings), None]
+                for i in open_rows:
+                    rows[i].append(cell_span)
+            if child.name == "tr":
+                row_index = len(rows)
+                rows.append([])
+                open_rows.append(row_index)
+            stack.append((child, len(strings), iter(child.contents), cell_span, row_index))
+        elif type(child) in _TEXT_TYPES:
+            text = child.strip()
+            if text:
+                strings.append(text)
+                lengths.append(lengths[-1] + len(text))
+    return [row for row in rows if row is not None], elements
+
+
+# Readiness predicates, polled in the page by wait_ready() until they return true
+
+# Every tracked name is in a td.name row whose td.status already has its SVG fills
+ROWS_WITH_FILLS_READY = """
+    (names) => {
+        const text = Array.from(document.querySelectorAll('tr'))
+            .filter(row => row.querySelector('td.name') && row.querySelector('td.status path[fill]'))
+            .map(row => row.querySelector('td.name').textContent.toLowerCase())
+            .join('\\n');
+        return names.every(n => text.includes(n));
+    }
+"""
+
+# Every tracked name is rendered and the Open/Closed status images are in
+NAMES_WITH_IMAGES_READY = """
+    (names) => {
+        if (!document.body) return false;
+        const text = document.body.innerText;
+        return names.every(n => text.includes(n))
+            && document.querySelector('img[alt="Open"], img[alt="Closed"]') !== null;
+    }
+"""
+
+# Every tracked name is rendered (case-insensitive)
+NAMES_RENDERED_READY = """
+    (names) => {
+        if (!document.body) return false;
+        const text = document.body.innerText.toLowerCase();
+        return names.every(n => text.includes(n.toLowerCase()));
+    }
+"""
+
+# Any of the given regexes matches the page text
+TEXT_MATCHES_READY = """
+    (patterns) => {
+        if (!document.body) return false;
+        const text = document.body.innerText;
+        return patterns.some(p => new RegExp(p, 'i').test(text));
+    }
+"""
+
+
+def wait_ready(page, resort, what, predicate, arg, ceiling_ms):
+    """Wait until predicate(arg) holds in the page, at most ceiling_ms; logs the time taken.
+
+    Replaces fixed sleeps: returns as soon as the content is there, and on
+    timeout the scraper carries on with whatever rendered, as before.
+    """
+    started = time.monotonic()
+    try:
+        page.wait_for_function(predicate, arg=arg, timeout=ceiling_ms, polling=250)
+    except Exception:
+        log(f"[{resort}] {what} not ready after {ceiling_ms} ms, scraping what rendered")
+        metrics.inc("scrape_wait_timeouts_total", resort=resort, what=what)
+        return False
+    log(f"[{resort}] {what} ready in {(time.monotonic() - started) * 1000:.0f} ms")
+    return True
+
+
 def scrape_snowbird(page):
     """Snowbird: SVG fill colors #8BC53F=open, #D0021B=closed in td.name+td.status rows."""
     try:
@@ -57,11 +306,7 @@ def scrape_snowbird(page):
 
         log("[snowbird] Loading terrain page...")
         page.goto(terrain_url, timeout=60000)
-        try:
-            page.wait_for_selector("td.name", timeout=15000)
-        except Exception:
-            pass
-        page.wait_for_timeout(3000)
+        wait_ready(page, "snowbird", "terrain", ROWS_WITH_FILLS_READY, list(name_map), 18000)
 
         terrain_data = page.evaluate("""
             () => {
@@ -96,15 +341,10 @@ def scrape_snowbird(page):
         try:
             log("[snowbird] Loading conditions page...")
             page.goto(conditions_url, timeout=60000)
-            page.wait_for_timeout(3000)
+            wait_ready(page, "snowbird", "snow report", TEXT_MATCHES_READY,
+                       [p.pattern for p in SNOW_PATTERNS["snowbird"]], 8000)
             text = page.evaluate("() => document.body.innerText")
-            m = re.search(r"24[\s\-]*(?:Hour|Hr)[\s\-]*Snow\s*([\d.]+)", text, re.IGNORECASE)
-            if m:
-                snow_24hr = float(m.group(1))
-            else:
-                m2 = re.search(r"([\d.]+)\s*[\"″]\s*24", text)
-                if m2:
-                    snow_24hr = float(m2.group(1))
+            snow_24hr = snow_from_text("snowbird", text)
         except Exception as e:
             log(f"[snowbird] Failed to get snow data: {e}")
 
@@ -115,8 +355,7 @@ def scrape_snowbird(page):
         }
 
     except Exception as e:
-        log(f"[snowbird] Scraper error: {e}")
-        return {"snow_24hr": 0.0, "terrain": []}
+        return _failure("snowbird", e)
 
 
 def scrape_brighton(page):
@@ -127,11 +366,7 @@ def scrape_brighton(page):
 
         log("[brighton] Loading page...")
         page.goto(url, timeout=60000)
-        try:
-            page.wait_for_selector("text=Trail Status", timeout=15000)
-        except Exception:
-            pass
-        page.wait_for_timeout(3000)
+        wait_ready(page, "brighton", "terrain", NAMES_WITH_IMAGES_READY, TRACKED["brighton"], 18000)
 
         trail_data = page.evaluate("""
             () => {
@@ -169,13 +404,7 @@ def scrape_brighton(page):
         snow_24hr = 0.0
         try:
             text = page.evaluate("() => document.body.innerText")
-            m = re.search(r"([\d.]+)[\"″\s]*Snow\s*24\s*Hrs", text, re.IGNORECASE)
-            if m:
-                snow_24hr = float(m.group(1))
-            else:
-                m2 = re.search(r"Snow\s*24\s*Hrs[.\s]*([\d.]+)", text, re.IGNORECASE)
-                if m2:
-                    snow_24hr = float(m2.group(1))
+            snow_24hr = snow_from_text("brighton", text)
         except Exception as e:
             log(f"[brighton] Failed to get snow data: {e}")
 
@@ -186,128 +415,125 @@ def scrape_brighton(page):
         }
 
     except Exception as e:
-        log(f"[brighton] Scraper error: {e}")
-        return {"snow_24hr": 0.0, "terrain": []}
+        return _failure("brighton", e)
+
+
+SNOWBASIN_URL = "https://www.snowbasin.com/the-mountain/mountain-report/"
+SOLITUDE_URL = "https://www.solitudemountain.com/mountain-and-village/conditions-and-maps"
+
+
+def parse_snowbasin(html):
+    """Terrain statuses and 24h snow from the Snowbasin mountain report HTML."""
+    soup = parse_html(html)
+
+    matcher = MATCHERS["snowbasin"]
+    terrain_results = {t: "closed" for t in TRACKED["snowbasin"]}
+
+    rows, _ = walk(soup, cell_tags=("td",))
+    for row in rows:
+        keys = matcher.find(row.lower())
+        if not keys:
+            continue
+        if LIFT_OPEN_RE.search(row):
+            status = "open"
+        elif LIFT_PENDING_RE.search(row):
+            status = "pending"
+        else:
+            status = "closed"
+        for key in keys:
+            terrain_results[matcher.names[key]] = status
+
+    return {
+        "snow_24hr": snow_from_text("snowbasin", soup.get_text()),
+        "terrain": [{"name": n, "status": terrain_results[n]} for n in TRACKED["snowbasin"]],
+    }
 
 
 def scrape_snowbasin():
     """Snowbasin: server-rendered HTML tables, no Playwright needed."""
     try:
         log("[snowbasin] Loading page...")
-        url = "https://www.snowbasin.com/the-mountain/mountain-report/"
-        resp = requests.get(url, headers=HEADERS, timeout=30)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "html.parser")
-
-        tracked_names = {t.lower(): t for t in TRACKED["snowbasin"]}
-        terrain_results = {t: "closed" for t in TRACKED["snowbasin"]}
-
-        rows = soup.find_all("tr")
-        for row in rows:
-            cells = row.find_all("td")
-            if len(cells) >= 2:
-                row_text = " ".join(c.get_text(strip=True) for c in cells).lower()
-                for key, name in tracked_names.items():
-                    if key in row_text:
-                        combined = " ".join(c.get_text(strip=True) for c in cells)
-                        if re.search(r"(?:Lift|Trail)\s+Open", combined, re.IGNORECASE):
-                            terrain_results[name] = "open"
-                        elif re.search(r"(?:Lift|Trail)\s+Pending", combined, re.IGNORECASE):
-                            terrain_results[name] = "pending"
-                        else:
-                            terrain_results[name] = "closed"
-
-        page_text = soup.get_text()
-        snow_24hr = 0.0
-        m = re.search(r"24[\s\-]*(?:Hour|Hr|Hrs?)[\s\-]*(?:Snow(?:fall)?)?[:\s]*([\d.]+)", page_text, re.IGNORECASE)
-        if m:
-            snow_24hr = float(m.group(1))
+        with metrics.span("scrape_phase_seconds", resort="snowbasin", phase="fetch"):
+            fetched = conditional_get(SNOWBASIN_URL, headers=HEADERS, timeout=30)
+        if fetched.unchanged:
+            # Still ingested on purpose: the first scrape of a day needs its
+            # daily_summary rows and the status intervals extend their valid_to.
+            # With no cell changed, the ingest neither unseals nor bumps data_version.
+            log("[snowbasin] Page unchanged since last scrape, reusing its result")
+            return fetched.parsed
+        with metrics.span("scrape_phase_seconds", resort="snowbasin", phase="parse"):
+            result = parse_snowbasin(fetched.response.text)
+        terrain = {t["name"]: t["status"] for t in result["terrain"]}
+        log(f"[snowbasin] Done. Terrain: {terrain}, Snow: {result['snow_24hr']}")
+        fetched.remember(result)
+        return result
+
+    except Exception as e:
+        return _failure("snowbasin", e)
+
+
+def parse_solitude(html, text):
+    """Terrain statuses and 24h snow from Solitude's rendered HTML and its innerText."""
+    matcher = MATCHERS["solitude"]
+    terrain_results = {t: "closed" for t in TRACKED["solitude"]}
+
+    rows, elements = walk(parse_html(html), cell_tags=("td", "th"),
+                          element_tags=("div", "li", "span", "button", "a"))
+
+    # Table rows set the status; the last matching row wins
+    for row in rows:
+        keys = matcher.find(row.lower())
+        if keys:
+            status = normalize_status(row)
+            for key in keys:
+                terrain_results[matcher.names[key]] = status
+
+    # Rendered text lines can upgrade to open or pending
+    for line in text.splitlines():
+        line_stripped = line.strip()
+        keys = matcher.find(line_stripped.lower())
+        if not keys:
+            continue
+        if OPEN_WORD_RE.search(line_stripped):
+            status = "open"
+        elif PENDING_WORD_RE.search(line_stripped):
+            status = "pending"
         else:
-            m2 = re.search(r"(?:New|Fresh)\s+Snow[:\s]*([\d.]+)", page_text, re.IGNORECASE)
-            if m2:
-                snow_24hr = float(m2.group(1))
+            continue
+        for key in keys:
+            terrain_results[matcher.names[key]] = status
 
-        log(f"[snowbasin] Done. Terrain: {terrain_results}, Snow: {snow_24hr}")
-        return {
-            "snow_24hr": snow_24hr,
-            "terrain": [{"name": n, "status": terrain_results[n]} for n in TRACKED["snowbasin"]],
-        }
+    # Short elements with "open" just after the name upgrade to open
+    for el_text in elements:
+        lower = el_text.lower()
+        for key in matcher.find(lower):
+            after = lower[lower.rfind(key) + len(key):][:80]
+            if "open" in after:
+                terrain_results[matcher.names[key]] = "open"
 
-    except Exception as e:
-        log(f"[snowbasin] Scraper error: {e}")
-        return {"snow_24hr": 0.0, "terrain": []}
+    return {
+        "snow_24hr": snow_from_text("solitude", text),
+        "terrain": [{"name": n, "status": terrain_results[n]} for n in TRACKED["solitude"]],
+    }
 
 
 def scrape_solitude(page):
     """Solitude: JS-rendered Alterra/Ikon platform."""
     try:
-        url = "https://www.solitudemountain.com/mountain-and-village/conditions-and-maps"
-        tracked_names = {t.lower(): t for t in TRACKED["solitude"]}
-        terrain_results = {t: "closed" for t in TRACKED["solitude"]}
-
         log("[solitude] Loading page...")
-        page.goto(url, timeout=60000)
-        try:
-            page.wait_for_selector("text=Lifts", timeout=20000)
-        except Exception:
-            pass
-        page.wait_for_timeout(5000)
+        page.goto(SOLITUDE_URL, timeout=60000)
+        wait_ready(page, "solitude", "terrain", NAMES_RENDERED_READY, TRACKED["solitude"], 25000)
 
         content = page.content()
         text = page.evaluate("() => document.body.innerText")
-
-        soup = BeautifulSoup(content, "html.parser")
-
-        rows = soup.find_all("tr")
-        for row in rows:
-            cells = row.find_all(["td", "th"])
-            if len(cells) >= 2:
-                row_text = " ".join(c.get_text(strip=True) for c in cells).lower()
-                for key, name in tracked_names.items():
-                    if key in row_text:
-                        combined = " ".join(c.get_text(strip=True) for c in cells)
-                        terrain_results[name] = normalize_status(combined)
-
-        for line in text.splitlines():
-            line_stripped = line.strip()
-            for key, name in tracked_names.items():
-                if key in line_stripped.lower():
-                    if re.search(r"\bopen\b", line_stripped, re.IGNORECASE):
-                        terrain_results[name] = "open"
-                    elif re.search(r"\bpending\b", line_stripped, re.IGNORECASE):
-                        terrain_results[name] = "pending"
-
-        elements = soup.find_all(["div", "li", "span", "button", "a"])
-        for el in elements:
-            el_text = el.get_text(strip=True)
-            for key, name in tracked_names.items():
-                if key in el_text.lower() and len(el_text) < 300:
-                    after = el_text.lower().split(key)[-1][:80]
-                    if "open" in after:
-                        terrain_results[name] = "open"
-
-        snow_24hr = 0.0
-        m = re.search(r"24[\s\-]*(?:Hour|Hr|Hrs?)[\s\-]*(?:Snow(?:fall)?)?[:\s]*([\d.]+)", text, re.IGNORECASE)
-        if m:
-            snow_24hr = float(m.group(1))
-        else:
-            m2 = re.search(r"(?:New|Fresh)\s+Snow[:\s]*([\d.]+)", text, re.IGNORECASE)
-            if m2:
-                snow_24hr = float(m2.group(1))
-            else:
-                m3 = re.search(r"([\d.]+)[\"″\s]*(?:in)?\s*(?:new|last|24)", text, re.IGNORECASE)
-                if m3:
-                    snow_24hr = float(m3.group(1))
-
-        log(f"[solitude] Done. Terrain: {terrain_results}, Snow: {snow_24hr}")
-        return {
-            "snow_24hr": snow_24hr,
-            "terrain": [{"name": n, "status": terrain_results[n]} for n in TRACKED["solitude"]],
-        }
+        with metrics.span("scrape_phase_seconds", resort="solitude", phase="parse"):
+            result = parse_solitude(content, text)
+        terrain = {t["name"]: t["status"] for t in result["terrain"]}
+        log(f"[solitude] Done. Terrain: {terrain}, Snow: {result['snow_24hr']}")
+        return result
 
     except Exception as e:
-        log(f"[solitude] Scraper error: {e}")
-        return {"snow_24hr": 0.0, "terrain": []}
+        return _failure("solitude", e)
 
 
 def scrape_powdermountain(page):
@@ -318,11 +544,7 @@ def scrape_powdermountain(page):
 
         log("[powdermountain] Loading page...")
         page.goto(url, timeout=30000, wait_until="domcontentloaded")
-        try:
-            page.wait_for_selector("text=Conditions", timeout=15000)
-        except Exception:
-            pass
-        page.wait_for_timeout(5000)
+        wait_ready(page, "powdermountain", "terrain", NAMES_RENDERED_READY, TRACKED["powdermountain"], 20000)
 
         text = page.evaluate("() => document.body.innerText")
 
@@ -384,17 +606,7 @@ def scrape_powdermountain(page):
 
         snow_24hr = 0.0
         try:
-            m = re.search(r"24[\s\-]*(?:Hours?|Hrs?)[\s\-]*(?:Snow(?:fall)?)?[:\s]*([\d.]+)", text, re.IGNORECASE)
-            if m:
-                snow_24hr = float(m.group(1))
-            else:
-                m2 = re.search(r"([\d.]+)[\"″\s]*(?:in)?\s*(?:new|overnight|24)", text, re.IGNORECASE)
-                if m2:
-                    snow_24hr = float(m2.group(1))
-                else:
-                    m3 = re.search(r"(?:New|Fresh)\s+Snow[:\s]*([\d.]+)", text, re.IGNORECASE)
-                    if m3:
-                        snow_24hr = float(m3.group(1))
+            snow_24hr = snow_from_text("powdermountain", text)
         except Exception as e:
             log(f"[powdermountain] Failed to get snow data: {e}")
 
@@ -405,54 +617,373 @@ def scrape_powdermountain(page):
         }
 
     except Exception as e:
-        log(f"[powdermountain] Scraper error: {e}")
-        return {"snow_24hr": 0.0, "terrain": []}
+        return _failure("powdermountain", e)
 
 
-def scrape_all():
-    """Scrape all resorts using ONE shared Chromium browser to save memory."""
-    from playwright.sync_api import sync_playwright
+PW_RESORTS = [
+    ("snowbird", scrape_snowbird),
+    ("brighton", scrape_brighton),
+    ("solitude", scrape_solitude),
+    ("powdermountain", scrape_powdermountain),
+]
+
+# Each concurrent worker runs its own Chromium (the sync Playwright API is
+# bound to the thread that started it). One browser with a single page tops
+# out around 350-450 MB with CHROMIUM_ARGS; the default budget leaves the rest
+# of the 2 GB VM to Flask, SQLite and the page cache.
+BROWSER_MB = int(os.environ.get("SCRAPE_BROWSER_MB", "450"))
+MEMORY_BUDGET_MB = int(os.environ.get("SCRAPE_MEMORY_BUDGET_MB", "1000"))
+CONCURRENCY = int(os.environ.get("SCRAPE_CONCURRENCY", "0")) or max(1, MEMORY_BUDGET_MB // BROWSER_MB)
+
+# "concurrent" (default) or "sequential", the original one-page-at-a-time path
+SCRAPE_MODE = os.environ.get("SCRAPE_MODE", "concurrent")
+
+PAGE_TIMEOUT_MS = 30000  # max per Playwright operation
+
 
-    results = {}
+def _empty():
+    return {"snow_24hr": 0.0, "terrain": []}
 
-    # Snowbasin doesn't need Playwright — do it first
-    results["snowbasin"] = scrape_snowbasin()
 
-    # Playwright resorts: fresh page per resort to limit memory buildup
-    pw_resorts = [
-        ("snowbird", scrape_snowbird),
-        ("brighton", scrape_brighton),
-        ("solitude", scrape_solitude),
-        ("powdermountain", scrape_powdermountain),
-    ]
+def _failure(resort_name, error):
+    log(f"[{resort_name}] Scraper error: {error}")
+    scrape_errors[resort_name] = str(error)
+    return _empty()
+
+
+def _block_reason(resort_name, resource_type, url):
+    """Why a request should be aborted (a resource type or "tracker"), or None to let it through."""
+    for allowed_type, pattern in ROUTE_ALLOW.get(resort_name, ()):
+        if resource_type == allowed_type and re.search(pattern, url):
+            return None
+    host = urlsplit(url).hostname or ""
+    if any(host == d or host.endswith("." + d) for d in BLOCKED_DOMAINS):
+        return "tracker"
+    if resource_type in BLOCKED_RESOURCE_TYPES:
+        return resource_type
+    return None
+
+
+def _instrument(context, resort_name, block):
+    """Install the routing policy on a context; returns the counters it fills in."""
+    stats = {"requests": 0, "bytes": 0, "blocked": 0, "blocked_by": {}}
+
+    def on_response(response):
+        stats["requests"] += 1
+        try:
+            stats["bytes"] += int(response.headers.get("content-length", 0))
+        except ValueError:
+            pass
+
+    def on_route(route):
+        reason = _block_reason(resort_name, route.request.resource_type, route.request.url)
+        if reason is None:
+            route.continue_()
+            return
+        stats["blocked"] += 1
+        stats["blocked_by"][reason] = stats["blocked_by"].get(reason, 0) + 1
+        route.abort()
+
+    context.on("response", on_response)
+    if block:
+        context.route("**/*", on_route)
+    return stats
+
+
+class TimedPage:
+    """Page proxy that times navigation, waits and in-page evaluation as scrape phases."""
+
+    PHASES = {
+        "goto": "goto",
+        "wait_for_function": "wait",
+        "wait_for_selector": "wait",
+        "wait_for_load_state": "wait",
+        "evaluate": "evaluate",
+        "content": "evaluate",
+    }
+
+    def __init__(self, page, resort_name):
+        self._page = page
+        self._resort_name = resort_name
+
+    def __getattr__(self, name):
+        attr = getattr(self._page, name)
+        phase = self.PHASES.get(name)
+        if phase is None:
+            return attr
+
+        def timed(*args, **kwargs):
+            with metrics.span("scrape_phase_seconds", resort=self._resort_name, phase=phase):
+                return attr(*args, **kwargs)
+        return timed
+
+
+class _Results(dict):
+    """scrape_all()'s results; reports each resort to the progress callback as it starts and finishes.
+
+    progress(resort, state, result=None, seconds=None, error=None) is called
+    with state "running", "done", "failed" or "skipped", one call at a time.
+    """
+
+    def __init__(self, progress):
+        super().__init__()
+        self._progress = progress
+        self._lock = threading.Lock()
+
+    def _report(self, resort_name, state, *args):
+        if self._progress is not None:
+            with self._lock:
+                self._progress(resort_name, state, *args)
+
+    def running(self, resort_name):
+        self._report(resort_name, "running")
+
+    def skipped(self, resort_name):
+        self._report(resort_name, "skipped")
+
+    def __setitem__(self, resort_name, data):
+        super().__setitem__(resort_name, data)
+        self._report(resort_name, "done" if data["terrain"] else "failed", data,
+                     scrape_seconds.get(resort_name), scrape_errors.get(resort_name))
+
+
+def _scrape_snowbasin_into(results, skipped):
+    if "snowbasin" in skipped:
+        return
+    results.running("snowbasin")
+    started = time.perf_counter()
+    with metrics.span("scrape_resort_seconds", resort="snowbasin"):
+        data = scrape_snowbasin()
+    scrape_seconds["snowbasin"] = time.perf_counter() - started
+    results["snowbasin"] = data
+
+
+def _scrape_in_context(browser, resort_name, scrape_fn):
+    """Run one resort in its own browser context so cookies/cache never leak between resorts."""
+    started = time.perf_counter()
+    context = browser.new_context(user_agent=HEADERS["User-Agent"], **fixtures.context_options(resort_name))
+    context.set_default_timeout(PAGE_TIMEOUT_MS)
+    stats = _instrument(context, resort_name, BLOCK_ASSETS)
+    # Registered last so a replayed HAR answers before the blocking route
+    fixtures.attach(context, resort_name)
+    try:
+        page = TimedPage(context.new_page(), resort_name)
+        result = scrape_fn(page)
+        fixtures.save_page(resort_name, page)
+        return result
+    except Exception as e:
+        return _failure(resort_name, e)
+    finally:
+        context.close()
+        scrape_seconds[resort_name] = time.perf_counter() - started
+        metrics.observe("scrape_resort_seconds", scrape_seconds[resort_name], resort=resort_name)
+        route_stats[resort_name] = stats
+        blocked = ", ".join(f"{k} {v}" for k, v in sorted(stats["blocked_by"].items()))
+        log(f"[{resort_name}] Loaded {stats['requests']} requests / {stats['bytes'] / 1024:.0f} KB, "
+            f"blocked {stats['blocked']}" + (f" ({blocked})" if blocked else ""))
+
+
+def _browser_worker(jobs, results):
+    """Launch a Chromium and drain resorts from the jobs queue into results."""
+    from playwright.sync_api import sync_playwright
 
-    log("[scraper] Launching Chromium...")
     try:
         with sync_playwright() as p:
             browser = p.chromium.launch(headless=True, args=CHROMIUM_ARGS)
-
-            for resort_name, scrape_fn in pw_resorts:
-                page = browser.new_page(user_agent=HEADERS["User-Agent"])
-                page.set_default_timeout(30000)  # 30s max per Playwright operation
+            while True:
                 try:
-                    results[resort_name] = scrape_fn(page)
-                except Exception as e:
-                    log(f"[scraper] {resort_name} error: {e}")
-                    results[resort_name] = {"snow_24hr": 0.0, "terrain": []}
-                finally:
-                    page.close()
-
+                    resort_name, scrape_fn = jobs.get_nowait()
+                except queue.Empty:
+                    break
+                results.running(resort_name)
+                results[resort_name] = _scrape_in_context(browser, resort_name, scrape_fn)
             browser.close()
-        log("[scraper] Chromium closed.")
     except Exception as e:
         log(f"[scraper] Chromium error: {e}")
-        for resort in ["snowbird", "brighton", "solitude", "powdermountain"]:
-            if resort not in results:
-                results[resort] = {"snow_24hr": 0.0, "terrain": []}
 
-    return results
+
+def scrape_all(concurrency=None, progress=None):
+    """Scrape all resorts; returns {resort: {"snow_24hr", "terrain"}}.
+
+    Playwright resorts run on the warm browser_service workers when this
+    process started them, otherwise over up to `concurrency` freshly launched
+    browsers (default CONCURRENCY). Each resort gets a fresh context, and
+    Snowbasin's plain HTTP scrape runs alongside. concurrency=1 is the
+    sequential path. Resorts whose circuit breaker is open (see health.py)
+    are skipped and left out of the result. progress, if given, hears about
+    each resort as it starts and finishes (see _Results).
+    """
+    use_service = concurrency is None and SCRAPE_MODE != "sequential" and browser_service.running()
+    if concurrency is None:
+        concurrency = 1 if SCRAPE_MODE == "sequential" else CONCURRENCY
+    started = time.monotonic()
+    results = _Results(progress)
+    scrape_errors.clear()
+    scrape_seconds.clear()
+
+    skipped = health.skipped(["snowbasin"] + [name for name, _ in PW_RESORTS])
+    for resort_name in sorted(skipped):
+        results.skipped(resort_name)
+    pw_resorts = [(name, fn) for name, fn in PW_RESORTS if name not in skipped]
+    if USE_FEEDS:
+        pw_resorts = _scrape_feeds(results, pw_resorts)
+    if not pw_resorts:
+        _scrape_snowbasin_into(results, skipped)
+        return _finish(results, skipped, started, "no Chromium needed")
+    concurrency = max(1, min(concurrency, len(pw_resorts)))
+
+    if use_service:
+        # Warm browsers: each scrape only pays for navigation
+        def job(browser, resort_name, scrape_fn):
+            results.running(resort_name)
+            # Stored from the browser thread so progress sees resorts in the order they finish
+            results[resort_name] = _scrape_in_context(browser, resort_name, scrape_fn)
+
+        futures = [
+            (resort_name, browser_service.submit(
+                lambda browser, name=resort_name, fn=scrape_fn: job(browser, name, fn)))
+            for resort_name, scrape_fn in pw_resorts
+        ]
+        _scrape_snowbasin_into(results, skipped)
+        for resort_name, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                results[resort_name] = _failure(resort_name, e)
+        return _finish(results, skipped, started, f"{len(browser_service.stats())} warm workers")
+
+    jobs = queue.Queue()
+    for job in pw_resorts:
+        jobs.put(job)
+
+    if concurrency == 1:
+        # Snowbasin doesn't need Playwright — do it first
+        _scrape_snowbasin_into(results, skipped)
+        log("[scraper] Launching Chromium...")
+        _browser_worker(jobs, results)
+    else:
+        log(f"[scraper] Launching {concurrency} Chromium workers...")
+        threads = [threading.Thread(target=_browser_worker, args=(jobs, results), daemon=True)
+                   for _ in range(concurrency)]
+        for t in threads:
+            t.start()
+        _scrape_snowbasin_into(results, skipped)
+        for t in threads:
+            t.join()
+    log("[scraper] Chromium closed.")
+    return _finish(results, skipped, started, f"concurrency {concurrency}")
+
+
+def _scrape_feeds(results, pw_resorts):
+    """Fill results from JSON feeds where a resort has one; returns the resorts still needing a browser."""
+    specs = feeds.load_specs()
+    remaining = []
+    for resort_name, scrape_fn in pw_resorts:
+        spec = specs.get(resort_name)
+        if spec is not None:
+            results.running(resort_name)
+            try:
+                started = time.perf_counter()
+                with metrics.span("scrape_phase_seconds", resort=resort_name, phase="feed"):
+                    data = feeds.fetch(resort_name, spec, TRACKED[resort_name])
+                scrape_seconds[resort_name] = time.perf_counter() - started
+                results[resort_name] = data
+                continue
+            except (feeds.FeedError, KeyError) as e:
+                log(f"[{resort_name}] Feed failed ({e}), falling back to Chromium")
+        remaining.append((resort_name, scrape_fn))
+    return remaining
+
+
+def _finish(results, skipped, started, how):
+    for resort_name, _ in PW_RESORTS:
+        if resort_name not in results and resort_name not in skipped:
+            results[resort_name] = _empty()
+    for resort_name, data in results.items():
+        if not data["terrain"]:
+            metrics.inc("scrape_errors_total", resort=resort_name)
+    health.record(results, scrape_errors, scrape_seconds)
+
+    log(f"[scraper] Scraped {len(results)} resorts in {time.monotonic() - started:.1f}s ({how})"
+        + (f", skipped {', '.join(sorted(skipped))}" if skipped else ""))
+    # Keep the resort order stable for logs and first-seen terrain ids
+    order = ["snowbasin"] + [name for name, _ in PW_RESORTS]
+    return {name: results[name] for name in order if name in results}
+
+
+def compare(concurrency=None):
+    """Time the sequential path against the concurrent one; prints and returns seconds."""
+    timings = {}
+    for label, n in (("sequential", 1), ("concurrent", concurrency or CONCURRENCY)):
+        started = time.monotonic()
+        scrape_all(concurrency=n)
+        timings[label] = round(time.monotonic() - started, 1)
+    log(f"[scraper] Wall clock: sequential {timings['sequential']}s, "
+        f"concurrent {timings['concurrent']}s")
+    return timings
+
+
+def capture(resorts, save=False):
+    """Record each resort's JSON traffic and report (or save) the feed it could use instead."""
+    from playwright.sync_api import sync_playwright
+
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+        for resort_name in resorts:
+            spec, calls = feeds.capture(resort_name, RESORT_PAGES[resort_name], TRACKED[resort_name],
+                                        browser, save=save)
+            if spec is None:
+                for call in calls:
+                    log(f"  {call['status']} {call['url']}")
+                log(f"[{resort_name}] No usable feed found; it stays on Chromium")
+            else:
+                print(json.dumps({resort_name: spec}, indent=2))
+        browser.close()
+
+
+def route_report():
+    """Scrape once with and once without blocking; prints requests and bytes saved per resort."""
+    global BLOCK_ASSETS
+    totals = {}
+    saved = BLOCK_ASSETS
+    try:
+        for BLOCK_ASSETS in (False, True):
+            scrape_all(concurrency=1)
+            totals[BLOCK_ASSETS] = {name: dict(stats) for name, stats in route_stats.items()}
+    finally:
+        BLOCK_ASSETS = saved
+    for resort_name, _ in PW_RESORTS:
+        full = totals[False].get(resort_name)
+        lean = totals[True].get(resort_name)
+        if not full or not lean:
+            continue
+        log(f"[scraper] {resort_name}: saved {full['requests'] - lean['requests']} requests, "
+            f"{(full['bytes'] - lean['bytes']) / 1024:.0f} KB "
+            f"({full['requests']} -> {lean['requests']} requests, "
+            f"{full['bytes'] / 1024:.0f} -> {lean['bytes'] / 1024:.0f} KB)")
+    return totals
 
 
 if __name__ == "__main__":
-    results = scrape_all()
-    print(json.dumps(results, indent=2))
+    if "--compare" in sys.argv:
+        compare()
+    elif "--route-report" in sys.argv:
+        route_report()
+    elif "--record" in sys.argv or "--replay" in sys.argv:
+        version = next((a for a in sys.argv[1:] if not a.startswith("--")), None)
+        if "--record" in sys.argv:
+            fixtures.record(version)
+            fixtures.save_results(scrape_all())
+        else:
+            fixtures.replay(version)
+            problems = fixtures.diff_results(fixtures.load_results(), scrape_all())
+            for problem in problems:
+                log(f"[fixtures] {problem}")
+            log(f"[fixtures] {len(problems)} difference(s) from the recording")
+            sys.exit(1 if problems else 0)
+    elif "--capture" in sys.argv:
+        capture([a for a in sys.argv[1:] if not a.startswith("--")] or list(RESORT_PAGES),
+                save="--save" in sys.argv)
+    else:
+        results = scrape_all()
+        print(json.dumps(results, indent=2))
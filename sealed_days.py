@@ -0,0 +1,100 @@
+"""Sealed, precompressed /api/status and /api/avalanche payloads for finished days.
+
+Once the Mountain-time day is over its status and avalanche responses never
+change, so they are rendered once, gzipped and stored in sealed_days. The web
+app serves them straight from there with far-future cache headers and only
+computes today's responses live. A write that lands on a sealed date
+(a late manual scrape) deletes the seal, and the next sealing run redoes it.
+"""
+
+import gzip
+import hashlib
+import json
+from datetime import datetime
+
+import pytz
+
+from database import (
+    get_daily_view, get_avalanche_forecast, get_data_version,
+    save_sealed_day, get_sealed_day, get_unsealed_dates,
+)
+
+MTN_TZ = pytz.timezone("America/Denver")
+
+# Bump when the payload shape changes so old seals are redone
+SEAL_FORMAT = 1
+
+KINDS = ("status", "avalanche")
+
+
+def status_payload(date_str):
+    """The /api/status body for a date."""
+    view = get_daily_view(date_str)
+
+    response = {}
+    for resort, terrain_list in view.items():
+        snow = terrain_list[0]["snowfall_24hr"] if terrain_list else 0.0
+        response[resort] = {
+            "snow_24hr": snow,
+            "terrain": [
+                {
+                    "name": t["terrain_name"],
+                    "ever_opened": bool(t["ever_opened"]),
+                    "closed_streak": t["closed_streak"],
+                }
+                for t in terrain_list
+            ],
+        }
+    return response
+
+
+def avalanche_payload(date_str):
+    """The /api/avalanche body for a date."""
+    return get_avalanche_forecast("salt-lake", date_str) or {}
+
+
+PAYLOADS = {"status": status_payload, "avalanche": avalanche_payload}
+
+
+def _encode(payload):
+    # Byte-for-byte what jsonify sends: sorted keys, compact separators, trailing newline
+    return json.dumps(payload, sort_keys=True, separators=(",", ":")).encode() + b"\n"
+
+
+def seal_day(date_str):
+    """Render and store both payloads; returns False if a write raced the render."""
+    sealed_at = datetime.now(MTN_TZ).isoformat()
+    stored = True
+    for kind in KINDS:
+        version = get_data_version()
+        body = _encode(PAYLOADS[kind](date_str))
+        etag = hashlib.sha1(body).hexdigest()[:20]
+        stored &= save_sealed_day(date_str, kind, SEAL_FORMAT, etag, gzip.compress(body, 9), sealed_at, version)
+    return stored
+
+
+def seal_finished_days(include_today=False):
+    """Seal every finished day that lacks a current seal; returns how many were sealed.
+
+    include_today seals today as well, for the run after the last scheduled
+    scrape; it is only served once the day is over.
+    """
+    today = datetime.now(MTN_TZ).strftime("%Y-%m-%d")
+    dates = set()
+    for kind in KINDS:
+        dates.update(get_unsealed_dates(kind, SEAL_FORMAT, today))
+    if include_today:
+        dates.add(today)
+    sealed = [d for d in sorted(dates) if seal_day(d)]
+    if sealed:
+        print(f"[seal] Sealed {len(sealed)} day(s) through {sealed[-1]}", flush=True)
+    if len(sealed) < len(dates):
+        print(f"[seal] {len(dates) - len(sealed)} day(s) changed while sealing; will retry next run", flush=True)
+    return len(sealed)
+
+
+def get_sealed(date_str, kind):
+    """Return (etag, gzipped body) if date_str is a finished, sealed day."""
+    if date_str >= datetime.now(MTN_TZ).strftime("%Y-%m-%d"):
+        return None
+    return get_sealed_day(date_str, kind, SEAL_FORMAT)
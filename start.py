@@ -1,66 +1,50 @@
-"""Combined entry point: runs the scheduler + Flask web app in one process."""
-
+"""Combined entry point: serves the web app and runs the scheduler.
+
+WEB_SERVER=gunicorn (the default when gunicorn is installed) serves the app
+from WEB_WORKERS processes with WEB_THREADS threads each; WEB_SERVER=flask
+uses Flask's development server in this process. Every serving process
+campaigns for leadership (leader.py), and only the leader runs the
+scheduler, the scrape worker and the startup fetches. If it dies, another
+process takes over within LEADER_POLL_S.
+
+The scrape worker is a spawned process that re-imports this module, so the
+web app (which opens the DB and warms the history pivot on import) is only
+imported by the functions that serve it.
+"""
+
+import importlib.util
+import os
 import threading
 import time
-from datetime import datetime
 
 import pytz
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 
-from database import init_db, save_snapshot, update_daily_summary, get_avalanche_forecast
-from scraper import scrape_all
-from avalanche import fetch_avalanche_forecast
-from app import app
+from database import init_db
+from jobs import run_scrape, run_avalanche, run_seal, serve_queue
+import leader
+import metrics
+import scrape_worker
+import sealed_days
 
 MTN_TZ = pytz.timezone("America/Denver")
 
-
-def run_scrape():
-    now = datetime.now(MTN_TZ)
-    date_str = now.strftime("%Y-%m-%d")
-    scraped_at = now.isoformat()
-
-    print(f"\n[{scraped_at}] Starting scrape...")
-
-    results = scrape_all()
-
-    for resort, data in results.items():
-        snow = data.get("snow_24hr", 0.0)
-        for t in data.get("terrain", []):
-            name = t["name"]
-            status = t["status"]
-            print(f"  {resort} | {name} | {status}")
-            save_snapshot(resort, name, status, scraped_at)
-            update_daily_summary(resort, name, date_str, status, snow)
-
-    print(f"[{scraped_at}] Scrape complete.\n")
-
-
-def run_avalanche():
-    """Fetch UAC avalanche forecast (skip if already have today's with image AND correct date)."""
-    import json
-    today = datetime.now(MTN_TZ).strftime("%Y-%m-%d")
-    existing = get_avalanche_forecast("salt-lake", today)
-    if existing:
-        try:
-            fj = json.loads(existing.get("forecast_json", "{}"))
-            issued_date = fj.get("issued_date", "")
-            if fj.get("danger_rose_image") and issued_date == today:
-                print(f"[avalanche] Today's forecast (issued {issued_date}) with rose image exists, skipping")
-                return
-        except Exception:
-            pass
-    try:
-        fetch_avalanche_forecast()
-    except Exception as e:
-        print(f"[avalanche] Scheduler error: {e}")
+PORT = int(os.environ.get("PORT", "8080"))
+WEB_SERVER = os.environ.get("WEB_SERVER", "gunicorn" if importlib.util.find_spec("gunicorn") else "flask")
+WEB_WORKERS = int(os.environ.get("WEB_WORKERS", "2"))
+WEB_THREADS = int(os.environ.get("WEB_THREADS", "4"))
 
 
 def start_scheduler():
     # Wait for Flask to bind before starting scraper
     time.sleep(3)
 
+    # Scrape in a supervised subprocess that keeps Chromium warm between the 15-minute scrapes
+    scrape_worker.start()
+    # Manual scrapes that landed on another gunicorn worker
+    serve_queue()
+
     scheduler = BackgroundScheduler(timezone=MTN_TZ)
     terrain_trigger = CronTrigger(hour="8-16", minute="*/15", timezone=MTN_TZ)
     scheduler.add_job(run_scrape, terrain_trigger)
@@ -69,22 +53,51 @@ def start_scheduler():
     scheduler.add_job(run_avalanche, CronTrigger(hour="5-9", minute="0,15,30,45", timezone=MTN_TZ))
     scheduler.add_job(run_avalanche, CronTrigger(hour=12, minute=0, timezone=MTN_TZ))
 
+    # Seal the day's payloads once the last scrape (16:45) is in
+    scheduler.add_job(run_seal, CronTrigger(hour=17, minute=0, timezone=MTN_TZ))
+
     scheduler.start()
     print("Scheduler started:")
     print("  - Terrain scrape: every 15 min, 8am-4pm Mountain Time")
     print("  - Avalanche: every 15min 5-9am MT + noon")
+    print("  - Seal finished days: 5pm MT")
 
     print("Running initial fetches in background...")
     threading.Thread(target=run_avalanche, daemon=True).start()
-    threading.Thread(target=run_scrape, daemon=True).start()
+    threading.Thread(target=run_scrape, kwargs={"trigger": "startup"}, daemon=True).start()
+    threading.Thread(target=sealed_days.seal_finished_days, daemon=True).start()
 
 
-if __name__ == "__main__":
-    init_db()
+def serve_gunicorn():
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"0.0.0.0:{PORT}")
+            self.cfg.set("workers", WEB_WORKERS)
+            self.cfg.set("threads", WEB_THREADS)
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("timeout", 60)
+            # Threads don't survive fork, so each worker campaigns once it is running
+            self.cfg.set("post_worker_init", lambda worker: leader.campaign(start_scheduler))
+            self.cfg.set("worker_exit", lambda server, worker: scrape_worker.stop())
 
-    # Run scheduler in a background thread
-    scraper_thread = threading.Thread(target=start_scheduler, daemon=True)
-    scraper_thread.start()
+        def load(self):
+            from app import app
+            return app
 
-    # Run Flask in the main thread
-    app.run(host="0.0.0.0", port=8080, debug=False)
+    print(f"Serving with gunicorn: {WEB_WORKERS} workers x {WEB_THREADS} threads on :{PORT}")
+    Server().run()
+
+
+if __name__ == "__main__":
+    init_db()
+    metrics.clear_shared()  # totals from a previous run of the server
+
+    if WEB_SERVER == "gunicorn":
+        serve_gunicorn()
+    else:
+        # Run the scheduler in a background thread, Flask in the main thread
+        from app import app
+        leader.campaign(start_scheduler)
+        app.run(host="0.0.0.0", port=PORT, debug=False)